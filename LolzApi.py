@@ -1,68 +1,2819 @@
+import asyncio
+import bisect
+import collections
+import collections.abc
+import contextlib
+import contextvars
+import datetime
+import email.utils
+import http.server
+import io
+import json
+import logging
+import math
+import mimetypes
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
 import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+def default_json_decoder():
+    """
+    Fastest json decoder available: orjson, then msgspec, then the standard library.
+    :return: function that takes the answer body as bytes
+    """
+    if orjson is not None:
+        return orjson.loads
+    if msgspec is not None:
+        return msgspec.json.Decoder().decode
+    return json.loads
+
+
+class LazyResponse(collections.abc.Mapping):
+    """
+    Decoded answer that keeps the raw body and decodes it only on first access, so answers that are
+    passed along or thrown away unread cost no decoding. Behaves like a read-only dict.
+    """
+
+    def __init__(self, content, decoder):
+        self.raw = content
+        self.decoder = decoder
+        self._data = None
+
+    @property
+    def data(self):
+        """
+        The decoded answer.
+        :rtype: json
+        """
+        if self._data is None:
+            self._data = self.decoder(self.raw)
+        return self._data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f'LazyResponse({self.data!r})' if self._data is not None else f'LazyResponse(<{len(self.raw)} bytes>)'
+
+
+class Model:
+    """
+    Compact typed view of an API object for holding many of them in memory.
+    The commonly used fields live in __slots__. Everything else (links, permissions, nested objects)
+    is kept json encoded and only decoded when accessed, as an attribute or through `extra`,
+    then kept decoded.
+    """
+    __slots__ = ('_extra',)
+    _names = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._names = frozenset(cls.__slots__)
+
+    def __init__(self, data):
+        # Fields the answer doesn't have stay unset, so to_dict() can leave them out
+        names = self._names
+        rest = {}
+        for key, value in data.items():
+            if key in names:
+                setattr(self, key, value)
+            else:
+                rest[key] = value
+        self._extra = _encode_json(rest) if rest else None
+
+    @property
+    def extra(self):
+        """
+        Fields that are not in __slots__.
+        :rtype: dict
+        """
+        extra = self._extra
+        if extra is None:
+            return {}
+        if isinstance(extra, bytes):
+            extra = self._extra = _decode_json(extra)
+        return extra
+
+    def __getattr__(self, name):
+        # Only called for names that are not set. Private names are state that isn't restored yet
+        # while copying or unpickling, looking them up in extra would recurse.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in type(self).__slots__:
+            return None
+        extra = self.extra
+        if name in extra:
+            return extra[name]
+        raise AttributeError(f'{type(self).__name__} has no field {name}')
+
+    def _fields(self):
+        """
+        :return: the fields in __slots__ that the answer had
+        :rtype: dict
+        """
+        fields = {}
+        for name in type(self).__slots__:
+            try:
+                fields[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return fields
+
+    def to_dict(self):
+        """
+        :return: the object as the API returned it
+        :rtype: dict
+        """
+        data = self._fields()
+        data.update(self.extra)
+        return data
+
+    def __getstate__(self):
+        return self._fields(), self._extra
+
+    def __setstate__(self, state):
+        fields, self._extra = state
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({getattr(self, type(self).__slots__[0])!r})'
+
+
+class Thread(Model):
+    __slots__ = ('thread_id', 'forum_id', 'thread_title', 'creator_user_id', 'creator_username',
+                 'thread_create_date', 'thread_update_date', 'thread_view_count', 'thread_post_count',
+                 'thread_is_published', 'thread_is_deleted', 'thread_is_sticky', 'thread_is_followed')
+
+
+class Post(Model):
+    __slots__ = ('post_id', 'thread_id', 'poster_user_id', 'poster_username', 'post_create_date',
+                 'post_update_date', 'post_body', 'post_body_plain_text', 'post_like_count',
+                 'post_is_published', 'post_is_deleted', 'post_is_liked')
+
+
+class User(Model):
+    __slots__ = ('user_id', 'username', 'user_title', 'user_register_date', 'user_last_seen_date',
+                 'user_message_count', 'user_like_count', 'user_is_valid', 'user_is_verified', 'user_is_followed')
+
+
+class Forum(Model):
+    __slots__ = ('forum_id', 'forum_title', 'forum_description', 'forum_thread_count', 'forum_post_count',
+                 'forum_is_followed')
+
+
+class Conversation(Model):
+    __slots__ = ('conversation_id', 'conversation_title', 'creator_user_id', 'creator_username',
+                 'conversation_create_date', 'conversation_update_date', 'conversation_message_count',
+                 'conversation_is_open', 'conversation_is_deleted')
+
+
+class Message(Model):
+    __slots__ = ('message_id', 'conversation_id', 'creator_user_id', 'creator_username', 'message_create_date',
+                 'message_body', 'message_body_plain_text')
+
+
+class Notification(Model):
+    __slots__ = ('notification_id', 'notification_create_date', 'notification_type', 'notification_is_unread',
+                 'content_type', 'content_id', 'content_action', 'creator_user_id', 'creator_username')
+
+
+# Model for the objects under each key of an answer.
+RESPONSE_MODELS = {
+    'thread': Thread, 'threads': Thread,
+    'post': Post, 'posts': Post,
+    'user': User, 'users': User,
+    'forum': Forum, 'forums': Forum,
+    'conversation': Conversation, 'conversations': Conversation,
+    'message': Message, 'messages': Message,
+    'notification': Notification, 'notifications': Notification,
+}
+
+
+def _encode_json(data):
+    """
+    :rtype: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+# Decoder of what _encode_json encoded, chosen once instead of on every access of a model field
+_decode_json = default_json_decoder()
+
+
+def _with_models(data):
+    """
+    Replace the objects of a decoded answer with their models, see RESPONSE_MODELS.
+    """
+    if not isinstance(data, dict):
+        return data
+    for key, model in RESPONSE_MODELS.items():
+        value = data.get(key)
+        if isinstance(value, dict):
+            data[key] = model(value)
+        elif isinstance(value, list):
+            data[key] = [model(item) if isinstance(item, dict) else item for item in value]
+    return data
+
+
+class RateLimiter:
+    """
+    Token bucket: allows `rate` requests per second on average and bursts of up to `burst` requests.
+    Thread safe. reserve() takes a token right away and returns how long the caller has to wait before
+    using it, so the same bucket paces both threads and coroutines.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Take one token.
+        :return: seconds to wait before sending the request
+        :rtype: float
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class RetryPolicy:
+    """
+    When and how long to wait before repeating a failed request.
+    Waits backoff * 2 ** (attempt - 1) seconds (capped by max_backoff) with full jitter,
+    or as long as the Retry-After header of the answer asks, if that is not longer than max_retry_after.
+    Only GET requests are retried by default, as repeating a POST can create a second thread/post/message.
+    """
+
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=30.0, statuses=(429, 500, 502, 503, 504),
+                 methods=('get',), max_retry_after=300.0):
+        """
+        :param attempts: total number of tries, 1 disables retries
+        :param backoff: base delay in seconds
+        :param max_backoff: upper bound for a single backoff delay in seconds
+        :param statuses: http statuses that are retried
+        :param methods: http methods that are retried
+        :param max_retry_after: longest Retry-After in seconds that is waited for. When the server asks
+            for more, the answer is returned without retrying.
+        """
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.methods = methods
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, method, attempt, status=None):
+        """
+        :param method: http method of the request
+        :param attempt: number of the try that just failed, starting from 1
+        :param status: http status of the answer, None when the connection failed
+        :return:
+        :rtype: bool
+        """
+        if attempt >= self.attempts or method.lower() not in self.methods:
+            return False
+        return status is None or status in self.statuses
+
+    def delay(self, attempt, retry_after=None):
+        """
+        :param attempt: number of the try that just failed, starting from 1
+        :param retry_after: value of the Retry-After header, seconds or an http date.
+            A malformed value falls back to the backoff.
+        :return: seconds to wait before the next try, None if Retry-After asks for more than max_retry_after
+        :rtype: float
+        """
+        seconds = _parse_retry_after(retry_after) if retry_after else None
+        if seconds is None:
+            return random.uniform(0, min(self.backoff * 2 ** (attempt - 1), self.max_backoff))
+        if self.max_retry_after is not None and seconds > self.max_retry_after:
+            return None
+        return seconds
+
+
+def _parse_retry_after(value):
+    """
+    :param value: Retry-After header, seconds or an http date
+    :return: seconds to wait, None if the value is malformed
+    :rtype: float
+    """
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        seconds = date.timestamp() - time.time()
+    if not math.isfinite(seconds):
+        return None
+    return max(seconds, 0.0)
+
+
+DEFAULT_TIMEOUTS = {
+    # requests applies the connect timeout while the body is being sent, so uploads get a long one too
+    'threads/attachments': (30, 120),
+    'posts/attachments': (30, 120),
+    'users/{userID}/avatar': (30, 120),
+    'conversations/attachments': (30, 120),
+    'conversation-messages/attachments': (30, 120),
+    'search': (5, 60),
+    'search/tagged': (5, 60),
+}
+
+_deadline = contextvars.ContextVar('lolzapi_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a call can't finish before the deadline set with LolzApi.deadline().
+    """
+
+
+class Deadline:
+    """
+    Time budget for all calls made inside the block, including nested and paginated ones:
+        with api.deadline(10):
+            threads = list(api.iter_threads(forum_id=876))
+    Every request waits at most for the time that is left, and once it runs out calls raise DeadlineExceeded.
+    Works with `async with` too. A nested deadline can only shorten the one around it.
+    """
+
+    def __init__(self, seconds):
+        """
+        :param seconds: time budget for the whole block
+        """
+        self.seconds = seconds
+        self.token = None
+
+    def __enter__(self):
+        expires = time.monotonic() + self.seconds
+        outer = _deadline.get()
+        self.token = _deadline.set(expires if outer is None else min(outer, expires))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _deadline.reset(self.token)
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.__exit__(exc_type, exc_value, traceback)
+
+
+def _time_left():
+    """
+    :return: seconds left before the current deadline, None if there is no deadline
+    :raises DeadlineExceeded: when the deadline has passed
+    """
+    expires = _deadline.get()
+    if expires is None:
+        return None
+    left = expires - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded('deadline exceeded')
+    return left
+
+
+def _within_deadline(delay):
+    """
+    :param delay: seconds to sleep before the next request
+    :return: delay
+    :raises DeadlineExceeded: when the deadline passes before the delay is over
+    """
+    left = _time_left()
+    if left is not None and delay >= left:
+        raise DeadlineExceeded('deadline exceeded')
+    return delay
+
+
+_call_stats = contextvars.ContextVar('lolzapi_call_stats', default=None)
+
+
+class CallStats:
+    """
+    What one call did and where its time went. LolzApi(sinks=[...]) hands one to every sink when a call is done.
+    Times are in seconds and add up over retries:
+        connect  - DNS lookup and TCP handshake, only spent when the call opened a new connection
+        tls      - TLS handshake of a new connection
+        ttfb     - from sending the request until the answer headers arrived
+        download - reading the answer body
+        decode   - json decoding of the answer
+        total    - the whole call, including rate limit and retry waits
+    """
+
+    __slots__ = ('method', 'path', 'status', 'statuses', 'error', 'cache', 'shared', 'request_bytes',
+                 'response_bytes', 'limiter_wait', 'connect', 'tls', 'ttfb', 'download', 'decode', 'total',
+                 'pool_in_use', 'pool_size', 'started', 'attempt_started', 'attempt_handshakes')
+
+    def __init__(self, method, path):
+        """
+        :param method: http method
+        :param path: path template of the endpoint, e.g. 'threads/{threadID}'
+        """
+        self.method = method.upper()
+        self.path = path
+        self.status = None
+        # Status of every try, None for tries that failed to connect
+        self.statuses = []
+        self.error = None
+        # 'hit', 'revalidated' or 'miss' for cacheable requests
+        self.cache = None
+        # The answer was shared by an identical call that was already in flight
+        self.shared = False
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.limiter_wait = 0.0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.ttfb = 0.0
+        self.download = 0.0
+        self.decode = 0.0
+        self.total = 0.0
+        # Most requests of the client that were in flight at once while this call was sent, and max_connections
+        self.pool_in_use = 0
+        self.pool_size = 0
+        self.started = time.perf_counter()
+        self.attempt_started = None
+        self.attempt_handshakes = 0.0
+
+    @property
+    def endpoint(self):
+        """
+        :return: http method and path template, e.g. 'GET threads/{threadID}'
+        """
+        return f'{self.method} {self.path}'
+
+    @property
+    def attempts(self):
+        return len(self.statuses)
+
+    def start_attempt(self):
+        self.attempt_started = time.perf_counter()
+        self.attempt_handshakes = self.connect + self.tls
+
+    def end_attempt(self, status, elapsed=None, request_bytes=None, content=None):
+        """
+        :param status: http status of the answer, None when the connection failed
+        :param elapsed: seconds from the start of the try until the answer headers arrived
+        :param request_bytes: value of the Content-Length header of the request
+        :param content: answer body, None if it is streamed and not read yet
+        """
+        self.statuses.append(status)
+        if status is None:
+            return
+        self.status = status
+        self.ttfb += max(elapsed - (self.connect + self.tls - self.attempt_handshakes), 0.0)
+        self.request_bytes += int(request_bytes or 0)
+        if content is not None:
+            self.download += max(time.perf_counter() - self.attempt_started - elapsed, 0.0)
+            self.response_bytes += len(content)
+
+    def __str__(self):
+        if self.error is not None:
+            outcome = type(self.error).__name__
+        elif self.status is not None:
+            outcome = self.status
+        else:
+            outcome = 'shared' if self.shared else 'cached'
+        phases = ', '.join(f'{phase} {getattr(self, phase) * 1000:.1f}'
+                           for phase in ('connect', 'tls', 'ttfb', 'download', 'decode'))
+        return (f'{self.endpoint} {outcome} in {self.total * 1000:.1f} ms ({phases} ms), '
+                f'{self.request_bytes} B sent, {self.response_bytes} B received')
+
+    def __repr__(self):
+        return f'<CallStats {self}>'
+
+
+class _TimedConnection:
+    """
+    Mixin for urllib3 connections that adds the time of opening them to the CallStats of the current call.
+    """
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self.connect_time = time.perf_counter() - started
+            stats = _call_stats.get()
+            if stats is not None:
+                stats.connect += self.connect_time
+
+
+class _TimedHTTPConnection(_TimedConnection, urllib3.connection.HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnection, urllib3.connection.HTTPSConnection):
+
+    def connect(self):
+        started = time.perf_counter()
+        self.connect_time = 0.0
+        try:
+            super().connect()
+        finally:
+            stats = _call_stats.get()
+            if stats is not None:
+                stats.tls += max(time.perf_counter() - started - self.connect_time, 0.0)
+
+
+class _TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections report their connect and TLS handshake times.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+class _Trace:
+    """
+    httpx trace extension that adds the connection phases of a request to a CallStats.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.started = {}
+        self.headers_received = None
+
+    def __call__(self, name, info):
+        event, _, state = name.rpartition('.')
+        now = time.perf_counter()
+        if state == 'started':
+            self.started[event] = now
+        elif state == 'complete':
+            seconds = now - self.started.pop(event, now)
+            if event == 'connection.connect_tcp':
+                self.stats.connect += seconds
+            elif event == 'connection.start_tls':
+                self.stats.tls += seconds
+            elif event.endswith('.receive_response_headers'):
+                self.headers_received = now
+
+    async def trace_async(self, name, info):
+        self(name, info)
+
+    def elapsed(self):
+        """
+        :return: seconds from the start of the try until the answer headers arrived
+        """
+        return (self.headers_received or time.perf_counter()) - self.stats.attempt_started
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Counts of observed values per bucket. A value goes into the first bucket whose upper bound is not less than it,
+    values above the last bound go into an extra overflow bucket.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: sorted upper bounds of the buckets
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Estimate a quantile by linear interpolation inside its bucket.
+        :param q: 0.5 for the median, 0.99 for the 99th percentile
+        :return: None if nothing was observed
+        :rtype: float
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for number, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if number == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[number - 1] if number else 0.0
+                return lower + (self.buckets[number] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class HistogramSink:
+    """
+    Sink that keeps a Histogram per endpoint and phase in memory:
+        histograms = HistogramSink()
+        api = LolzApi(token, sinks=[histograms])
+        ...
+        print(histograms.summary()['POST search'])
+    connect and tls are only observed for calls that opened a new connection.
+    """
+
+    PHASES = ('connect', 'tls', 'ttfb', 'download', 'decode', 'total')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, stats):
+        with self.lock:
+            for phase in self.PHASES:
+                value = getattr(stats, phase)
+                if phase in ('connect', 'tls') and not value:
+                    continue
+                key = (stats.endpoint, phase)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(self.buckets)
+                self.histograms[key].observe(value)
+
+    def histogram(self, endpoint, phase='total'):
+        """
+        :param endpoint: http method and path template, e.g. 'GET threads/{threadID}'
+        :param phase: one of PHASES
+        :rtype: Histogram
+        """
+        return self.histograms.get((endpoint, phase))
+
+    def summary(self):
+        """
+        :return: {endpoint: {phase: {'count', 'mean', 'p50', 'p90', 'p99'}}}, times in seconds
+        :rtype: dict
+        """
+        result = {}
+        with self.lock:
+            for (endpoint, phase), histogram in self.histograms.items():
+                result.setdefault(endpoint, {})[phase] = {
+                    'count': histogram.count, 'mean': histogram.sum / histogram.count,
+                    'p50': histogram.quantile(0.5), 'p90': histogram.quantile(0.9), 'p99': histogram.quantile(0.99)}
+        return result
+
+
+class LoggingSink:
+    """
+    Sink that logs one line per call:
+        GET threads/{threadID} 200 in 84.2 ms (connect 0.0, tls 0.0, ttfb 80.1, download 2.9, decode 0.4 ms), ...
+    """
+
+    def __init__(self, logger=None, level=logging.DEBUG):
+        """
+        :param logger: logging.Logger, the 'LolzApi' logger by default
+        :param level: logging level of the lines
+        """
+        self.logger = logger or logging.getLogger('LolzApi')
+        self.level = level
+
+    def __call__(self, stats):
+        self.logger.log(self.level, '%s', stats)
+
+
+def _prometheus_labels(labels):
+    """
+    :param labels: sorted (name, value) pairs
+    :return: label set in the Prometheus text format, e.g. {method="GET",endpoint="threads"}
+    :rtype: str
+    """
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+class PrometheusSink:
+    """
+    Sink that keeps Prometheus metrics of the calls and exports them in the text exposition format:
+        metrics = PrometheusSink(labels={'worker': '3'})
+        api = LolzApi(token, sinks=[metrics])
+        metrics.serve(9464)  # or metrics.write_textfile(path) for the node_exporter textfile collector
+    Calls are labeled by http method and endpoint (path template), so every api method has its own series.
+    """
+
+    PHASES = ('connect', 'tls', 'ttfb', 'download', 'decode')
+    SATURATION_BUCKETS = (0.25, 0.5, 0.75, 0.9, 1.0, 1.5, 2.0)
+    METRICS = {
+        'calls_total': ('counter', 'Calls by final http status, "error" when the call raised'),
+        'call_duration_seconds': ('histogram', 'Duration of whole calls, including rate limit and retry waits'),
+        'phase_duration_seconds': ('histogram', 'Time spent per phase of a call'),
+        'retries_total': ('counter', 'Requests repeated by the retry policy'),
+        'rate_limited_total': ('counter', 'Answers with status 429'),
+        'cache_requests_total': ('counter', 'Cacheable calls by cache result: hit, revalidated or miss'),
+        'cache_hit_ratio': ('gauge', 'Share of cacheable calls answered from the cache without a full request'),
+        'rate_limiter_wait_seconds_total': ('counter', 'Time spent waiting for the client-side rate limiters'),
+        'request_bytes_total': ('counter', 'Request body bytes sent'),
+        'response_bytes_total': ('counter', 'Answer body bytes received'),
+        'pool_in_use': ('gauge', 'Requests in flight when the last call was sent'),
+        'pool_max_connections': ('gauge', 'max_connections of the client'),
+        'pool_saturation': ('histogram', 'Requests in flight divided by max_connections, when calls are sent'),
+    }
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, labels=None, namespace='lolzapi'):
+        """
+        :param buckets: upper bounds of the latency histogram buckets in seconds
+        :param labels: constant labels added to every series, e.g. {'worker': '3'}
+        :param namespace: prefix of the metric names
+        """
+        self.buckets = buckets
+        self.labels = tuple(sorted((labels or {}).items()))
+        self.namespace = namespace
+        self.values = {}
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        self.lock = threading.Lock()
+
+    def _add(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.values[key] = self.values.get(key, 0) + value
+
+    def _set(self, name, value, **labels):
+        self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def _observe(self, name, value, buckets=None, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        if key not in self.values:
+            self.values[key] = Histogram(buckets or self.buckets)
+        self.values[key].observe(value)
+
+    def __call__(self, stats):
+        labels = {'method': stats.method, 'endpoint': stats.path}
+        if stats.error is not None:
+            status = 'error'
+        elif stats.status is not None:
+            status = str(stats.status)
+        else:
+            status = 'shared' if stats.shared else 'cached'
+        with self.lock:
+            self._add('calls_total', 1, status=status, **labels)
+            self._observe('call_duration_seconds', stats.total, **labels)
+            for phase in self.PHASES:
+                value = getattr(stats, phase)
+                if value or phase not in ('connect', 'tls'):
+                    self._observe('phase_duration_seconds', value, phase=phase, **labels)
+            self._add('retries_total', max(stats.attempts - 1, 0), **labels)
+            self._add('rate_limited_total', stats.statuses.count(429), **labels)
+            if stats.cache is not None:
+                self._add('cache_requests_total', 1, result=stats.cache, **labels)
+                self.cache_lookups += 1
+                self.cache_hits += stats.cache != 'miss'
+                self._set('cache_hit_ratio', self.cache_hits / self.cache_lookups)
+            self._add('rate_limiter_wait_seconds_total', stats.limiter_wait, **labels)
+            self._add('request_bytes_total', stats.request_bytes, **labels)
+            self._add('response_bytes_total', stats.response_bytes, **labels)
+            if stats.pool_size:
+                self._set('pool_in_use', stats.pool_in_use)
+                self._set('pool_max_connections', stats.pool_size)
+                self._observe('pool_saturation', stats.pool_in_use / stats.pool_size, self.SATURATION_BUCKETS)
+
+    def render(self):
+        """
+        :return: all metrics in the Prometheus text exposition format
+        :rtype: str
+        """
+        with self.lock:
+            samples = sorted(self.values.items(), key=lambda item: item[0])
+            lines = []
+            for name, (kind, description) in self.METRICS.items():
+                full_name = f'{self.namespace}_{name}'
+                series = [(labels, value) for (sample, labels), value in samples if sample == name]
+                if not series:
+                    continue
+                lines.append(f'# HELP {full_name} {description}')
+                lines.append(f'# TYPE {full_name} {kind}')
+                for labels, value in series:
+                    labels = self.labels + labels
+                    if kind != 'histogram':
+                        lines.append(f'{full_name}{_prometheus_labels(labels)} {value}')
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        lines.append(f'{full_name}_bucket{_prometheus_labels(labels + (("le", bound),))} {cumulative}')
+                    lines.append(f'{full_name}_sum{_prometheus_labels(labels)} {value.sum}')
+                    lines.append(f'{full_name}_count{_prometheus_labels(labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """
+        Write the metrics to a file for the node_exporter textfile collector, replacing it atomically.
+        :param path: file path, should end with .prom
+        """
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(self.render())
+        os.replace(temporary, path)
+
+    def serve(self, port=9464, host=''):
+        """
+        Serve the metrics over http from a daemon thread, on every path.
+        :param port:
+        :param host: address to listen on, all interfaces by default
+        :return: the server, call shutdown() on it to stop
+        :rtype: http.server.ThreadingHTTPServer
+        """
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _has_next_page(response, items, key, seen):
+    """
+    Whether a paginated answer has more pages after this one.
+    :param response: decoded answer of the page
+    :param items: items of the page
+    :param key: key of the item list, its total is under key + '_total'
+    :param seen: number of items walked so far
+    :rtype: bool
+    """
+    if not items:
+        return False
+    links = response.get('links')
+    if links is not None:
+        return 'next' in links
+    total = response.get(f'{key}_total')
+    return total is not None and seen < total
+
+
+def _last_page(response, key, page):
+    """
+    Number of the last page of a paginated answer.
+    :param response: decoded answer of `page`
+    :param key: key of the item list
+    :param page: number of the page the answer belongs to
+    :return: None if the answer does not tell
+    :rtype: int
+    """
+    links = response.get('links') or {}
+    if 'pages' in links:
+        return links['pages']
+    items = response.get(key)
+    total = response.get(f'{key}_total')
+    if page == 1 and items and total is not None:
+        return -(-total // len(items))
+    return None
+
+
+class _PageWalk:
+    """
+    Parent span of a paginated walk. Calling it fetches a page with the span as the current one,
+    so the span of every page call becomes its child.
+    """
+
+    def __init__(self, tracer, fetch, prefetch):
+        self.fetch = fetch
+        self.pages = 0
+        self.span = tracer.start_span(f'paginate {fetch.__name__}', attributes={'lolzapi.prefetch': prefetch})
+
+    def __call__(self, **kwargs):
+        self.pages += 1
+        with otel_trace.use_span(self.span):
+            return self.fetch(**kwargs)
+
+    async def fetch_async(self, **kwargs):
+        self.pages += 1
+        with otel_trace.use_span(self.span):
+            return await self.fetch(**kwargs)
+
+    def end(self, error=None):
+        """
+        :param error: exception that stopped the walk
+        """
+        self.span.set_attribute('lolzapi.pages', self.pages)
+        if error is not None:
+            self.span.record_exception(error)
+            self.span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, type(error).__name__))
+        self.span.end()
+
+
+# Seconds to keep answers, keyed by path template. Answers of endpoints with 0 are kept only
+# for ETag/Last-Modified revalidation: every call asks the server, but an unchanged answer comes back as
+# an empty 304 and is served from the cache.
+DEFAULT_CACHE_TTLS = {
+    'categories': 3600,
+    'categories/{categoryID}': 3600,
+    'forums': 3600,
+    'forums/{forumID}': 3600,
+    'navigation': 3600,
+    'pages': 3600,
+    'users/fields': 3600,
+    'users/groups': 3600,
+    'tags': 600,
+    'threads/{threadID}': 0,
+    'posts': 0,
+    'notifications': 0,
+}
+
+
+def _query_params(data):
+    """
+    GET parameters in canonical form: sorted by name, with lists joined by commas as the API expects them.
+    None values are left out, like requests does with params.
+    :rtype: list
+    """
+    return [(key, ','.join(str(item) for item in value) if isinstance(value, (list, tuple)) else value)
+            for key, value in sorted(data.items()) if value is not None]
+
+
+def _cache_key(method, url, data):
+    """
+    Canonical cache key of a request: method, url and sorted parameters.
+    :rtype: str
+    """
+    key = f'{method.upper()} {url}'
+    if data:
+        key += '?' + urlencode(sorted(data.items()), doseq=True)
+    return key
+
+
+class ResponseCache:
+    """
+    In-memory cache of raw answer bodies with per-endpoint TTLs and LRU eviction.
+    Only GET requests to the endpoints listed in `ttls` are cached.
+    Expired answers that came with an ETag or Last-Modified header are kept for revalidation.
+    """
+
+    def __init__(self, maxsize=1024, ttls=None):
+        """
+        :param maxsize: max number of cached answers, the least recently used one is dropped first
+        :param ttls: seconds to keep answers, keyed by path template, DEFAULT_CACHE_TTLS by default
+        """
+        self.maxsize = maxsize
+        self.ttls = DEFAULT_CACHE_TTLS if ttls is None else ttls
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def ttl(self, path):
+        """
+        :param path: path template
+        :return: seconds to keep answers of the endpoint, None if it is not cached
+        """
+        return self.ttls.get(path)
+
+    def get(self, key):
+        """
+        :param key: key from _cache_key
+        :return: cached body, None if missing or expired
+        :rtype: bytes
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_stale(self, key):
+        """
+        Cached answer with its validators, even if expired.
+        :param key: key from _cache_key
+        :return: (body, etag, last_modified), None if missing or the answer had no validators
+        :rtype: tuple
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or not (entry[3] or entry[4]):
+                return None
+            return entry[2:]
+
+    def set(self, key, path, content, ttl, etag=None, last_modified=None):
+        """
+        :param key: key from _cache_key
+        :param path: path template, used by invalidate
+        :param content: raw answer body
+        :param ttl: seconds to keep it
+        :param etag: ETag header of the answer
+        :param last_modified: Last-Modified header of the answer
+        """
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, path, content, etag, last_modified)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def refresh(self, key, ttl):
+        """
+        Mark a stale answer fresh again after the server answered 304 Not Modified.
+        :param key: key from _cache_key
+        :param ttl: seconds to keep it
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries[key] = (time.monotonic() + ttl,) + entry[1:]
+                self.entries.move_to_end(key)
+            self.revalidated += 1
+
+    def invalidate(self, path=None):
+        """
+        Drop cached answers.
+        :param path: path template, e.g. 'forums/{forumID}', drops everything if omitted
+        """
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+                return
+            for key in [key for key, entry in self.entries.items() if entry[1] == path]:
+                del self.entries[key]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteCache:
+    """
+    Disk-backed version of ResponseCache in an sqlite database, so cached answers survive restarts.
+    Answers are dropped once expired (unless kept for revalidation), and the least recently used ones go first
+    when the total size of the bodies exceeds max_size. For example, to also keep users and threads across deploys:
+        SQLiteCache('lolz_cache.sqlite', ttls=dict(DEFAULT_CACHE_TTLS, **{'users/{userID}': 600,
+                                                                          'threads/{threadID}': 600}))
+    Several processes can share the file. Database errors (e.g. a lock held too long by another process)
+    are logged and treated as misses, so they never fail the call itself.
+    """
+
+    def __init__(self, filename, max_size=256 * 1024 * 1024, ttls=None, flush_interval=5.0):
+        """
+        :param filename: path of the sqlite database, created if missing
+        :param max_size: max total size of the cached bodies in bytes
+        :param ttls: seconds to keep answers, keyed by path template, DEFAULT_CACHE_TTLS by default
+        :param flush_interval: seconds between writes of the access times of hits, which only matter for eviction
+        """
+        self.max_size = max_size
+        self.ttls = DEFAULT_CACHE_TTLS if ttls is None else ttls
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.errors = 0
+        self.accessed = {}
+        self.flushed = time.monotonic()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, timeout=5.0, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, path TEXT, content BLOB, '
+                        'size INTEGER, expires REAL, accessed REAL, etag TEXT, last_modified TEXT)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        # The total size is kept up to date by triggers, so every process sharing the file sees it
+        # without summing the whole table on each write
+        self.db.execute('CREATE TABLE IF NOT EXISTS total_size (size INTEGER)')
+        self.db.execute('INSERT INTO total_size SELECT COALESCE(SUM(size), 0) FROM responses '
+                        'WHERE NOT EXISTS (SELECT 1 FROM total_size)')
+        self.db.execute('CREATE TRIGGER IF NOT EXISTS responses_insert AFTER INSERT ON responses '
+                        'BEGIN UPDATE total_size SET size = size + new.size; END')
+        self.db.execute('CREATE TRIGGER IF NOT EXISTS responses_delete AFTER DELETE ON responses '
+                        'BEGIN UPDATE total_size SET size = size - old.size; END')
+        self.db.execute('CREATE TRIGGER IF NOT EXISTS responses_update AFTER UPDATE OF size ON responses '
+                        'BEGIN UPDATE total_size SET size = size - old.size + new.size; END')
+        self.db.commit()
+
+    def _failed(self, action):
+        self.errors += 1
+        with contextlib.suppress(sqlite3.Error):
+            self.db.rollback()
+        logging.getLogger('LolzApi').warning('SQLiteCache %s failed', action, exc_info=True)
+
+    def _flush_accessed(self):
+        """
+        Write the access times of recent hits in one transaction. Called with the lock held.
+        """
+        if self.accessed:
+            self.db.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                                [(accessed, key) for key, accessed in self.accessed.items()])
+            self.accessed.clear()
+        self.flushed = time.monotonic()
+
+    def ttl(self, path):
+        return self.ttls.get(path)
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            try:
+                row = self.db.execute('SELECT content, expires FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[1] >= now:
+                    self.accessed[key] = now
+                    if time.monotonic() - self.flushed >= self.flush_interval:
+                        self._flush_accessed()
+                        self.db.commit()
+            except sqlite3.Error:
+                self._failed('get')
+                row = None
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def get_stale(self, key):
+        with self.lock:
+            try:
+                return self.db.execute('SELECT content, etag, last_modified FROM responses WHERE key = ? '
+                                       'AND (etag IS NOT NULL OR last_modified IS NOT NULL)', (key,)).fetchone()
+            except sqlite3.Error:
+                self._failed('get_stale')
+                return None
+
+    def set(self, key, path, content, ttl, etag=None, last_modified=None):
+        now = time.time()
+        with self.lock:
+            try:
+                self.accessed.pop(key, None)
+                self._flush_accessed()
+                self.db.execute('INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE '
+                                'SET path = excluded.path, content = excluded.content, size = excluded.size, '
+                                'expires = excluded.expires, accessed = excluded.accessed, etag = excluded.etag, '
+                                'last_modified = excluded.last_modified',
+                                (key, path, content, len(content), now + ttl, now, etag, last_modified))
+                self.db.execute('DELETE FROM responses WHERE expires < ? AND etag IS NULL AND last_modified IS NULL',
+                                (now,))
+                total = self.db.execute('SELECT size FROM total_size').fetchone()[0]
+                if total > self.max_size:
+                    for old_key, size in self.db.execute('SELECT key, size FROM responses '
+                                                         'ORDER BY accessed').fetchall():
+                        self.db.execute('DELETE FROM responses WHERE key = ?', (old_key,))
+                        total -= size
+                        if total <= self.max_size:
+                            break
+                self.db.commit()
+            except sqlite3.Error:
+                self._failed('set')
+
+    def refresh(self, key, ttl):
+        now = time.time()
+        with self.lock:
+            try:
+                self.db.execute('UPDATE responses SET expires = ?, accessed = ? WHERE key = ?', (now + ttl, now, key))
+                self.db.commit()
+                self.revalidated += 1
+            except sqlite3.Error:
+                self._failed('refresh')
+
+    def invalidate(self, path=None):
+        with self.lock:
+            self.accessed.clear()
+            if path is None:
+                self.db.execute('DELETE FROM responses')
+            else:
+                self.db.execute('DELETE FROM responses WHERE path = ?', (path,))
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            with contextlib.suppress(sqlite3.Error):
+                self._flush_accessed()
+                self.db.commit()
+            self.db.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+
+class CassetteMiss(LookupError):
+    """
+    Raised when a Cassette in 'replay' mode has no answer for a request.
+    """
+
+
+# POST endpoints that only read, a Cassette records and replays them like GET requests
+READ_ONLY_POSTS = frozenset(('search', 'search/tagged'))
+
+# Headers that describe the transfer, not the answer. Recorded bodies are already decoded.
+_UNRECORDED_HEADERS = frozenset(('connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+                                 'content-length', 'set-cookie'))
+
+
+def _replay_key(method, url, kwargs):
+    """
+    Cassette key of a request from the arguments of _send.
+    :return: key from _cache_key, None for requests that can't be replayed (uploads)
+    :rtype: str
+    """
+    if kwargs.get('files') or kwargs.get('content') is not None:
+        return None
+    data = kwargs.get('data')
+    if kwargs.get('json') is not None:
+        data = {'json': json.dumps(kwargs['json'], sort_keys=True, separators=(',', ':'))}
+    elif data is not None and not isinstance(data, dict):
+        return None
+    key = _cache_key(method, url, data)
+    # A partial answer to a Range request must not be replayed for the whole body
+    byte_range = (kwargs.get('headers') or {}).get('Range')
+    return f'{key} Range: {byte_range}' if byte_range else key
+
+
+class Cassette:
+    """
+    Recorded answers in a compact sqlite file, so jobs that go over the same data again and again
+    can replay them offline, without waiting for the network and without spending the rate budget:
+        api = LolzApi(token, cassette=Cassette('crawl.cassette'))
+    Answers are keyed by the canonical request (method, url and sorted parameters). Bodies are stored
+    zlib-compressed in parts, so streamed downloads are recorded and replayed without holding them in memory.
+    Only successful (2xx) final answers are recorded, not errors or the tries that were retried.
+    Only reads are recorded: GET requests, the POST endpoints in read_only_posts and batches made of them.
+    Writes (liking, posting, marking as read, ...) and uploads are always sent.
+    """
+
+    def __init__(self, filename, mode='auto', latency=None, level=6, part_size=1024 * 1024,
+                 read_only_posts=READ_ONLY_POSTS):
+        """
+        :param filename: path of the cassette, created if missing
+        :param mode: 'auto' replays recorded requests and records the others,
+            'replay' never sends anything and raises CassetteMiss for requests that are not recorded and for writes,
+            'record' sends every request and overwrites what was recorded for it
+        :param latency: simulated latency of replayed answers: seconds, 'recorded' for the time the answer
+            took when it was recorded, None answers at once
+        :param level: zlib compression level of the bodies, 1 is the fastest, 9 the smallest
+        :param part_size: bytes of a body compressed and stored together
+        :param read_only_posts: paths of the POST endpoints that only read, see READ_ONLY_POSTS
+        """
+        if mode not in ('auto', 'record', 'replay'):
+            raise ValueError(f'unknown cassette mode {mode!r}')
+        self.mode = mode
+        self.latency = latency
+        self.level = level
+        self.part_size = part_size
+        self.read_only_posts = frozenset(read_only_posts)
+        self.replayed = 0
+        self.recorded = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(filename, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, recording TEXT, status INTEGER, '
+                        'headers TEXT, size INTEGER, elapsed REAL, recorded REAL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS parts (recording TEXT, number INTEGER, content BLOB, '
+                        'PRIMARY KEY (recording, number))')
+        self.db.commit()
+
+    def replays(self, method, path, json_body=None):
+        """
+        :param path: path template of the request
+        :param json_body: json body of the request, the jobs of a batch
+        :return: whether the request only reads, so its answer may be recorded and replayed
+        :rtype: bool
+        """
+        method = method.upper()
+        if method == 'GET':
+            return True
+        if method != 'POST':
+            return False
+        if path == 'batch' and isinstance(json_body, list):
+            return all(isinstance(job, dict) and (job.get('method') == 'GET' or job.get('method') == 'POST'
+                                                  and job.get('uri') in self.read_only_posts) for job in json_body)
+        return path in self.read_only_posts
+
+    def lookup(self, key):
+        """
+        :param key: key from _replay_key
+        :return: recorded (status, headers, size, elapsed seconds, recording id), None if the request should be sent
+        :rtype: tuple
+        """
+        if self.mode == 'record':
+            return None
+        with self.lock:
+            row = self.db.execute('SELECT status, headers, size, elapsed, recording FROM answers WHERE key = ?',
+                                  (key,)).fetchone()
+        if row is None:
+            if self.mode == 'replay':
+                raise CassetteMiss(key)
+            return None
+        self.replayed += 1
+        status, headers, size, elapsed, recording = row
+        return status, json.loads(headers), size, elapsed, recording
+
+    def content(self, recording):
+        """
+        :param recording: recording id from lookup
+        :return: generator of the parts of the body, read one at a time
+        """
+        number = 0
+        while True:
+            with self.lock:
+                row = self.db.execute('SELECT content FROM parts WHERE recording = ? AND number = ?',
+                                      (recording, number)).fetchone()
+            if row is None:
+                return
+            yield zlib.decompress(row[0])
+            number += 1
+
+    def records(self, status):
+        """
+        :param status: http status of a final answer
+        :return: whether the answer is recorded. Errors are not, so a transient 503 isn't replayed forever.
+        :rtype: bool
+        """
+        return 200 <= status < 300
+
+    def recorder(self, key, status, headers, elapsed):
+        """
+        :param key: key from _replay_key
+        :param status: http status of the answer
+        :param headers: answer headers
+        :param elapsed: seconds the answer took
+        :rtype: _CassetteRecorder
+        """
+        headers = {name: value for name, value in headers.items() if name.lower() not in _UNRECORDED_HEADERS}
+        return _CassetteRecorder(self, key, status, headers, elapsed)
+
+    def record(self, key, status, headers, content, elapsed):
+        """
+        Record an answer that is already read.
+        :param content: decoded answer body
+        """
+        recorder = self.recorder(key, status, headers, elapsed)
+        recorder.write(content)
+        recorder.finish()
+
+    def _write_part(self, recording, number, content):
+        with self.lock:
+            self.db.execute('INSERT INTO parts VALUES (?, ?, ?)',
+                            (recording, number, zlib.compress(content, self.level)))
+
+    def _finish(self, recorder):
+        with self.lock:
+            old = self.db.execute('SELECT recording FROM answers WHERE key = ?', (recorder.key,)).fetchone()
+            self.db.execute('INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (recorder.key, recorder.recording, recorder.status, json.dumps(recorder.headers),
+                             recorder.size, recorder.elapsed, time.time()))
+            if old is not None:
+                self.db.execute('DELETE FROM parts WHERE recording = ?', old)
+            self.db.commit()
+            self.recorded += 1
+
+    def _drop(self, recording):
+        with self.lock:
+            self.db.execute('DELETE FROM parts WHERE recording = ?', (recording,))
+            self.db.commit()
+
+    def delay(self, elapsed):
+        """
+        :param elapsed: seconds the answer took when it was recorded
+        :return: seconds to wait before replaying the answer
+        :rtype: float
+        """
+        if self.latency == 'recorded':
+            return elapsed or 0.0
+        return self.latency or 0.0
+
+    def close(self):
+        self.db.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM answers').fetchone()[0]
+
+
+class _CassetteRecorder:
+    """
+    Records one answer into a Cassette part by part while its body is read.
+    The answer is only saved by finish(), a body that is not read to the end is dropped.
+    """
+
+    def __init__(self, cassette, key, status, headers, elapsed):
+        self.cassette = cassette
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.elapsed = elapsed
+        self.recording = uuid.uuid4().hex
+        self.pending = bytearray()
+        self.parts = 0
+        self.size = 0
+        self.done = False
+
+    def write(self, chunk):
+        self.pending += chunk
+        self.size += len(chunk)
+        if len(self.pending) >= self.cassette.part_size:
+            self._flush()
+
+    def _flush(self):
+        self.cassette._write_part(self.recording, self.parts, bytes(self.pending))
+        self.parts += 1
+        self.pending.clear()
+
+    def finish(self):
+        if self.done:
+            return
+        if self.pending:
+            self._flush()
+        self.cassette._finish(self)
+        self.done = True
+
+    def abandon(self):
+        """
+        Drop the parts written so far if the body was not read to the end.
+        """
+        if not self.done:
+            self.done = True
+            self.cassette._drop(self.recording)
+
+
+class _RecordingResponse:
+    """
+    Streamed answer that records its body into a cassette while it is read.
+    Everything else is passed through to the wrapped response.
+    """
+
+    def __init__(self, response, recorder):
+        self.response = response
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    @property
+    def content(self):
+        content = self.response.content
+        if not self.recorder.done:
+            self.recorder.write(content)
+            self.recorder.finish()
+        return content
+
+    def iter_content(self, chunk_size=None):
+        for chunk in self.response.iter_content(chunk_size):
+            self.recorder.write(chunk)
+            yield chunk
+        self.recorder.finish()
+
+    def aiter_bytes(self, chunk_size=None):
+        return self._aiter_bytes(chunk_size)
+
+    async def _aiter_bytes(self, chunk_size):
+        async for chunk in self.response.aiter_bytes(chunk_size):
+            self.recorder.write(chunk)
+            yield chunk
+        self.recorder.finish()
+
+    async def aread(self):
+        content = await self.response.aread()
+        if not self.recorder.done:
+            self.recorder.write(content)
+            self.recorder.finish()
+        return content
+
+    def close(self):
+        self.recorder.abandon()
+        self.response.close()
+
+    async def aclose(self):
+        self.recorder.abandon()
+        await self.response.aclose()
+
+
+async def _aiter_parts(parts):
+    for part in parts:
+        yield part
+
+
+class _PartsReader(io.RawIOBase):
+    """
+    Read-only file over the parts of a replayed body, for requests.Response.raw.
+    """
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.rest = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.rest:
+            part = next(self.parts, None)
+            if part is None:
+                return 0
+            self.rest = memoryview(part)
+        size = min(len(buffer), len(self.rest))
+        buffer[:size] = self.rest[:size]
+        self.rest = self.rest[size:]
+        return size
+
+
+class DownloadRestartError(Exception):
+    """
+    Raised when a download has to start over (the file changed on the server) but part of the body is already
+    written to a sink that can't seek, so it can't be rewound and going on would splice two different bodies.
+    """
+
+
+class _Download:
+    """
+    State of a streamed download into a file path, a binary file-like object or memory.
+    Shared by the sync and async clients.
+    After a dropped connection the download continues with a Range request guarded by If-Range,
+    so a file that changed on the server in the meantime is downloaded again instead of spliced.
+    """
+
+    def __init__(self, sink, resume=False):
+        """
+        :param sink: file path, binary file-like object, or None to collect the body in memory
+        :param resume: continue an existing file at the sink path instead of overwriting it
+        """
+        self.sink = sink
+        self.is_path = isinstance(sink, (str, os.PathLike))
+        self.file = None
+        self.start_position = 0
+        self.offset = os.path.getsize(sink) if resume and self.is_path and os.path.exists(sink) else 0
+        self.resumed = False
+        self.validator = None
+        self.skip = 0
+        self.content_type = None
+        self.content_length = None
+
+    def headers(self):
+        """
+        :return: Range header to continue from what is already written, with If-Range if the validator is known
+        """
+        if not self.offset:
+            return None
+        headers = {'Range': f'bytes={self.offset}-'}
+        if self.validator:
+            headers['If-Range'] = self.validator
+        return headers
+
+    def complete(self, headers):
+        """
+        :param headers: headers of a 416 answer to a Range request
+        :return: True if what is written already is the whole body
+        :rtype: bool
+        """
+        total = headers.get('Content-Range', '').rsplit('/', 1)[-1]
+        if total.isdigit() and int(total) == self.offset:
+            self.content_length = self.offset
+            self.resumed = True
+            return True
+        return False
+
+    def restart(self):
+        """
+        Forget what is written, the next request asks for the whole body.
+        """
+        if self.file is not None:
+            self._rewind()
+        self.offset = 0
+        self.resumed = False
+
+    def _rewind(self):
+        """
+        Drop what is written, it belongs to another body than the one that will be written.
+        """
+        if not self.file.seekable():
+            raise DownloadRestartError(f'the body changed after {self.offset} bytes were written to a sink '
+                                       f'that can not seek')
+        self.file.seek(self.start_position)
+        self.file.truncate()
+        self.offset = 0
+
+    def start(self, status, headers):
+        """
+        Prepare to write the body of a 200 or 206 answer.
+        """
+        if_range = self.validator
+        self.content_type = headers.get('Content-Type')
+        etag = headers.get('ETag')
+        # Weak ETags can't be used in If-Range
+        self.validator = etag if etag and not etag.startswith('W/') else headers.get('Last-Modified')
+        if status == 206 and '/' in headers.get('Content-Range', ''):
+            total = headers['Content-Range'].rsplit('/', 1)[1]
+            self.content_length = int(total) if total.isdigit() else None
+            self.resumed = self.resumed or self.offset > 0
+        else:
+            # The whole body: the file changed since (If-Range didn't match) or the server ignored Range
+            self.content_length = int(headers['Content-Length']) if 'Content-Length' in headers else None
+            if self.file is not None and self.offset and not if_range and not self.file.seekable():
+                # Nothing says the body changed, drop the part that is already written
+                self.skip = self.offset
+            elif self.file is not None and self.offset:
+                self._rewind()
+            else:
+                self.offset = 0
+            self.resumed = False
+        if self.file is None:
+            if self.sink is None:
+                self.file = io.BytesIO()
+            elif self.is_path:
+                self.file = open(self.sink, 'ab' if self.offset else 'wb')
+            else:
+                self.file = self.sink
+                self.start_position = self.sink.tell() if self.sink.seekable() else 0
+
+    def write(self, chunk):
+        if self.skip:
+            dropped = min(self.skip, len(chunk))
+            chunk = chunk[dropped:]
+            self.skip -= dropped
+            if not chunk:
+                return
+        self.file.write(chunk)
+        self.offset += len(chunk)
+
+    def result(self):
+        """
+        :return: the body if there is no sink, else metadata of the download
+        """
+        if self.sink is None:
+            return self.file.getvalue() if self.file is not None else b''
+        return {'size': self.offset, 'content_type': self.content_type,
+                'content_length': self.content_length or self.offset, 'resumed': self.resumed}
+
+    def close(self):
+        if self.is_path and self.file is not None:
+            self.file.close()
+
+
+_JSON_STRUCTURE = re.compile(rb'["{}\[\],:]')
+
+
+class _JsonArrayStream:
+    """
+    Incremental parser for a json object that arrives in chunks. Finds the top level `key` array
+    and hands out the raw bytes of every element as soon as it is complete, so only the element
+    being parsed is buffered, never the whole body.
+    """
+
+    def __init__(self, key):
+        self.key = json.dumps(key).encode()
+        self.buffer = bytearray()
+        self.pos = 0
+        self.depth = 0
+        self.state = 'seek'  # seek -> colon -> array -> done
+        self.in_string = False
+        self.string_start = None
+        self.last_string = None
+        self.item_start = None
+
+    def feed(self, chunk):
+        """
+        :param chunk: next part of the body
+        :return: raw json of the elements completed by this chunk
+        :rtype: list
+        """
+        buffer = self.buffer
+        buffer += chunk
+        items = []
+        pos = self.pos
+        while pos < len(buffer) and self.state != 'done':
+            if self.in_string:
+                end = buffer.find(b'"', pos)
+                if end < 0:
+                    pos = len(buffer)
+                    break
+                pos = end + 1
+                backslashes = 0
+                while buffer[end - 1 - backslashes] == 0x5c:
+                    backslashes += 1
+                if backslashes % 2:
+                    continue
+                self.in_string = False
+                if self.state == 'seek' and self.depth == 1:
+                    self.last_string = bytes(buffer[self.string_start:pos])
+                continue
+            match = _JSON_STRUCTURE.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+            char = buffer[match.start()]
+            pos = match.end()
+            if char == 0x22:  # "
+                self.in_string = True
+                self.string_start = match.start()
+                continue
+            if self.state == 'colon':
+                if char == 0x5b:  # [
+                    self.depth += 1
+                    self.state = 'array'
+                    self.item_start = pos
+                    continue
+                # The value under the key is not an array, keep looking
+                self.state = 'seek'
+            if self.state == 'seek':
+                if char == 0x3a and self.depth == 1 and self.last_string == self.key:  # :
+                    self.state = 'colon'
+                elif char in b'{[':
+                    self.depth += 1
+                elif char in b'}]':
+                    self.depth -= 1
+                self.last_string = None
+            elif char in b'{[':
+                self.depth += 1
+            elif char in b'}]':
+                self.depth -= 1
+                if self.depth == 2:
+                    items.append(bytes(buffer[self.item_start:pos]))
+                    self.item_start = None
+                elif self.depth == 1:
+                    self.state = 'done'
+                    if self.item_start is not None and buffer[self.item_start:match.start()].strip():
+                        items.append(bytes(buffer[self.item_start:match.start()]))
+            elif char == 0x2c and self.depth == 2:  # ,
+                if self.item_start is not None and buffer[self.item_start:match.start()].strip():
+                    items.append(bytes(buffer[self.item_start:match.start()]))
+                self.item_start = pos
+        # Drop what is parsed already
+        if self.state == 'array' and self.item_start is not None:
+            keep = self.item_start
+        elif self.in_string:
+            keep = self.string_start
+        else:
+            keep = pos
+        del buffer[:keep]
+        self.pos = pos - keep
+        if self.item_start is not None:
+            self.item_start -= keep
+        if self.string_start is not None:
+            self.string_start -= keep
+        return items
+
+
+class ApiError(Exception):
+    """
+    Raised by stream_* and iter_* methods when the API answers with an error, since a stream or a walk over
+    pages has no answer to return it in.
+    """
+
+    def __init__(self, status, answer):
+        """
+        :param status: http status of the answer, None if it is not known (iter_* only see the decoded answer)
+        :param answer: decoded error answer, e.g. {'errors': [...]}, or the text if it is not json
+        """
+        super().__init__(f'{status}: {answer}')
+        self.status = status
+        self.answer = answer
+
+
+def _error_answer(decoder, content):
+    """
+    :return: decoded error answer, or its text if it is not json (e.g. an html page of a proxy)
+    """
+    try:
+        return decoder(content)
+    except Exception:
+        return content.decode('utf-8', 'replace')
+
+
+def _page_items(response, key):
+    """
+    :param response: decoded answer of a page
+    :param key: key of the item list
+    :return: items of the page
+    :rtype: list
+    :raises ApiError: if the page was answered with an error, so a failed page doesn't end the walk as if it was
+        the last one
+    """
+    if response.get('errors'):
+        raise ApiError(None, response)
+    return response.get(key) or []
+
+
+class _StreamingRequest:
+    """
+    Stand-in for the client that endpoint methods are called on by LolzApi._stream,
+    so their answer is streamed instead of decoded at once.
+    """
+
+    def __init__(self, api, key):
+        self.api = api
+        self.key = key
+
+    def _request(self, method, path, data=None, files=None, json_body=None, **path_params):
+        return self.api._stream_items(method, path, self.key, data, path_params)
+
+
+class _MultipartStream:
+    """
+    multipart/form-data body that reads the file from disk chunk by chunk while it is being sent,
+    instead of building the whole body in memory. Works as a file-like body for requests
+    and as an iterable body for httpx (aiter_chunks() for the async client).
+    """
+
+    def __init__(self, fields, name, file, progress=None, chunk_size=64 * 1024):
+        """
+        :param fields: plain form fields
+        :param name: form field of the file
+        :param file: binary file object or path to it
+        :param progress: callback progress(sent_bytes, total_bytes)
+        :param chunk_size: bytes per read
+        """
+        boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self.close_file = isinstance(file, (str, os.PathLike))
+        self.file = open(file, 'rb') if self.close_file else file
+        self.progress = progress
+        self.chunk_size = chunk_size
+        filename = os.path.basename(str(getattr(self.file, 'name', name))).replace('"', '%22')
+        file_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        head = ''.join(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'
+                       for key, value in fields.items())
+        head += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                 f'Content-Type: {file_type}\r\n\r\n')
+        tail = f'\r\n--{boundary}--\r\n'.encode()
+        start = self.file.tell()
+        file_size = self.file.seek(0, os.SEEK_END) - start
+        self.file.seek(start)
+        self.parts = [io.BytesIO(head.encode()), self.file, io.BytesIO(tail)]
+        self.part = 0
+        self.length = len(head.encode()) + file_size + len(tail)
+        self.sent = 0
+
+    def __len__(self):
+        return self.length
+
+    def tell(self):
+        return self.sent
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length
+        chunks = []
+        while size > 0 and self.part < len(self.parts):
+            chunk = self.parts[self.part].read(size)
+            if not chunk:
+                self.part += 1
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        chunk = b''.join(chunks)
+        self.sent += len(chunk)
+        if chunk and self.progress:
+            self.progress(self.sent, self.length)
+        return chunk
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    async def aiter_chunks(self):
+        for chunk in self:
+            yield chunk
+
+    def close(self):
+        if self.close_file:
+            self.file.close()
+
+
+def _httpx_timeout(timeout):
+    """
+    :param timeout: seconds or a (connect, read) tuple, as requests takes it
+    :rtype: httpx.Timeout
+    """
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+class _HTTP2Response:
+    """
+    httpx response with the parts of the requests.Response interface that LolzApi uses.
+    """
+
+    def __init__(self, response, trace=None):
+        self.response = response
+        self.request = response.request
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.trace = trace
+
+    @property
+    def elapsed(self):
+        return datetime.timedelta(seconds=self.trace.elapsed() if self.trace else 0.0)
+
+    @property
+    def content(self):
+        try:
+            return self.response.read()
+        except httpx.TransportError as error:
+            raise requests.ConnectionError(error) from error
+
+    def iter_content(self, chunk_size=None):
+        try:
+            yield from self.response.iter_bytes(chunk_size)
+        except httpx.TransportError as error:
+            raise requests.ConnectionError(error) from error
+
+    def close(self):
+        self.response.close()
+
+
+class _HTTP2Session:
+    """
+    requests.Session-like wrapper around httpx.Client for LolzApi(http2=True).
+    Concurrent requests from several threads are multiplexed as HTTP/2 streams over one TLS connection.
+    httpx errors are raised as requests errors, so retries work the same way as with the default session.
+    """
+
+    def __init__(self, headers, max_connections=100, max_keepalive_connections=20):
+        if httpx is None:
+            raise ImportError('http2=True requires httpx with HTTP/2 support, '
+                              'install it with "pip install httpx[http2]"')
+        self.client = httpx.Client(
+            http2=True, headers=headers, timeout=None, follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive_connections))
+        self.headers = self.client.headers
+
+    def request(self, method, url, stream=False, data=None, timeout=None, **kwargs):
+        kwargs['timeout'] = _httpx_timeout(timeout)
+        if isinstance(data, _MultipartStream):
+            kwargs['content'] = data
+        else:
+            kwargs['data'] = data
+        stats = _call_stats.get()
+        trace = _Trace(stats) if stats is not None else None
+        if trace is not None:
+            kwargs['extensions'] = {'trace': trace}
+        try:
+            request = self.client.build_request(method.upper(), url, **kwargs)
+            return _HTTP2Response(self.client.send(request, stream=stream), trace)
+        except httpx.TimeoutException as error:
+            raise requests.Timeout(error) from error
+        except httpx.TransportError as error:
+            raise requests.ConnectionError(error) from error
+
+    def close(self):
+        self.client.close()
+
+
+class BatchJob:
+    """
+    A call queued in a Batch. Its answer is available from result() once the batch has been sent.
+    """
+
+    def __init__(self, method, uri, params):
+        self.method = method
+        self.uri = uri
+        self.params = params
+        self.response = None
+        self.done = False
+
+    def result(self):
+        """
+        :return: answer of the call
+        :rtype: json
+        """
+        if not self.done:
+            raise RuntimeError('The batch has not been sent yet')
+        return self.response
+
+
+class Batch:
+    """
+    Has the endpoint methods of LolzApi, but they queue a BatchJob instead of sending a request.
+    All queued calls go out as a single POST /batch request when the `with` block ends,
+    spending one round trip and one unit of the rate budget. Created by LolzApi.batch().
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self.jobs = []
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name.startswith('iter_') or not hasattr(type(self.api), name):
+            raise AttributeError(f'{name} can not be batched')
+        return getattr(type(self.api), name).__get__(self)
+
+    def _request(self, method, path, data=None, files=None, json_body=None, **path_params):
+        if files or json_body is not None:
+            raise ValueError('Requests with files or a json body can not be batched')
+        data = self.api._with_fields(method, path, data) or {}
+        if method == 'get':
+            data = dict(_query_params(data))
+        else:
+            data = {key: value for key, value in data.items() if value is not None}
+        job = BatchJob(method.upper(), path.format(**path_params), data)
+        self.jobs.append(job)
+        return job
+
+    def _upload(self, *args, **kwargs):
+        raise ValueError('Uploads can not be batched')
+
+    def _download(self, *args, **kwargs):
+        raise ValueError('Downloads can not be batched')
+
+    def _payload(self):
+        return [{'id': str(number), 'method': job.method, 'uri': job.uri, 'params': job.params}
+                for number, job in enumerate(self.jobs)]
+
+    def _resolve(self, response):
+        """
+        Hand every job its own answer from the /batch answer.
+        """
+        results = response.get('jobs') if isinstance(response, collections.abc.Mapping) else None
+        for number, job in enumerate(self.jobs):
+            if results is None:
+                # The whole batch failed, every job gets the error
+                job.response = response
+            else:
+                result = results.get(str(number), {})
+                if result.get('_job_result') == 'error':
+                    job.response = {'errors': [result.get('_job_error')]}
+                elif '_job_response' in result:
+                    job.response = result['_job_response']
+                else:
+                    job.response = {key: value for key, value in result.items() if not key.startswith('_job_')}
+            job.done = True
+
+    def send(self):
+        """
+        Send the queued calls. Called automatically at the end of the `with` block.
+        """
+        if self.jobs:
+            self._resolve(self.api._request('post', 'batch', json_body=self._payload()))
+
+    async def send_async(self):
+        """
+        Send the queued calls with AsyncLolzApi. Called automatically at the end of the `async with` block.
+        """
+        if self.jobs:
+            self._resolve(await self.api._request('post', 'batch', json_body=self._payload()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.send_async()
 
 
 class LolzApi:
-    def __init__(self, token):
+    def __init__(self, token, rate_limit=None, burst=1, endpoint_limits=None, retry_policy=None, cache=None,
+                 coalesce=True, fields_include=None, fields_exclude=None, json_decoder=None, lazy=False,
+                 models=False, http2=False, max_connections=10, pool_connections=10, pool_block=False,
+                 keep_alive=True, timeout=(5, 30), endpoint_timeouts=None, sinks=None, tracer=None, cassette=None):
+        """
+        :param token:
+        :param rate_limit: requests per second for all calls, None means no client-side limit
+        :param burst: how many requests may go out at once before rate_limit pacing starts
+        :param endpoint_limits: separate (rate_limit, burst) budgets for expensive endpoints, keyed by path,
+            e.g. {'search': (0.3, 1), 'search/tagged': (0.3, 1)}. These calls also count against rate_limit.
+        :param retry_policy: RetryPolicy for 429/5xx answers and connection errors,
+            RetryPolicy() by default, RetryPolicy(attempts=1) disables retries
+        :param cache: ResponseCache or SQLiteCache for near-static and polled endpoints, None disables caching
+        :param coalesce: identical GET requests made at the same time from several threads/coroutines
+            share one http request and its answer. Calls made under a deadline always send their own request.
+        :param fields_include: default fields_include per endpoint, keyed by path template, used when a call
+            does not pass its own, e.g. {'threads': ['thread_id', 'thread_title', 'thread_update_date']}
+        :param fields_exclude: default fields_exclude per endpoint, keyed by path template
+        :param json_decoder: function that decodes an answer body given as bytes,
+            orjson or msgspec when installed, json.loads otherwise
+        :param lazy: return LazyResponse objects that decode the answer only when it is accessed
+        :param models: return threads, posts, users, forums, conversations, messages and notifications
+            in answers as Thread, Post, User, ... models instead of dicts
+        :param http2: talk to the api over HTTP/2, so concurrent calls share one TLS connection
+            instead of opening a connection each. Requires httpx with HTTP/2 support (pip install httpx[http2])
+        :param max_connections: connections kept open to the api host, set it to the number of worker threads
+            so they don't discard each other's connections
+        :param pool_connections: how many hosts the connection pool keeps connections for
+        :param pool_block: when all max_connections are busy, wait for a free one instead of opening
+            an extra connection that is closed after the call
+        :param keep_alive: reuse connections between calls, False closes each connection after its call
+        :param timeout: seconds or a (connect, read) tuple for every request, None waits forever
+        :param endpoint_timeouts: timeouts for particular endpoints, keyed by path template,
+            DEFAULT_TIMEOUTS (longer ones for uploads and search) by default
+        :param sinks: functions that get a CallStats with the status, phase timings and byte counts
+            of every call, e.g. [print, LoggingSink(), HistogramSink()]
+        :param tracer: OpenTelemetry tracer, e.g. opentelemetry.trace.get_tracer('LolzApi').
+            Every call gets a client span, and iter_* walks a parent span with the calls of its pages under it
+        :param cassette: Cassette to replay recorded answers from and record new ones to, for offline runs
+        """
         self.token = token
         self.base_url = 'https://api.lolz.guru/'
-        self.session = requests.Session()
-        self.session.headers = {'Authorization': f'Bearer {self.token}'}
+        self.rate_limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+        self.endpoint_limiters = {path: RateLimiter(*limit) for path, limit in (endpoint_limits or {}).items()}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self.coalesce = coalesce
+        self.fields_include = fields_include or {}
+        self.fields_exclude = fields_exclude or {}
+        self.json_decoder = json_decoder or default_json_decoder()
+        self.lazy = lazy
+        self.models = models
+        self.http2 = http2
+        self.max_connections = max_connections
+        self.pool_connections = pool_connections
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.endpoint_timeouts = DEFAULT_TIMEOUTS if endpoint_timeouts is None else endpoint_timeouts
+        self.sinks = list(sinks or ())
+        self.tracer = tracer
+        self.cassette = cassette
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+        self.active_requests = 0
+        self.session = self._make_session()
+
+    def _make_session(self):
+        if self.http2:
+            return _HTTP2Session({'Authorization': f'Bearer {self.token}'}, self.max_connections,
+                                 self.max_connections if self.keep_alive else 0)
+        session = requests.Session()
+        session.headers = {'Authorization': f'Bearer {self.token}'}
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        adapter = _TimedHTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.max_connections,
+                              pool_block=self.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def warmup(self, connections=1):
+        """
+        Resolve DNS and open connections to the api ahead of time, so the first calls don't wait for
+        the TCP and TLS handshakes. Call it once at start-up, e.g. with connections set to the number of workers.
+        With http2=True one connection serves every call, so only one is opened.
+        Connections are taken from and put back into the urllib3 pool with its private _get_conn/_put_conn,
+        without them (another adapter or urllib3 version) nothing is opened and the first calls connect as usual.
+        :param connections: how many connections to open, at most max_connections
+        :return: None
+        """
+        connections = min(connections, self.max_connections)
+        if not self.keep_alive or connections < 1:
+            return
+        if self.http2:
+            self.session.request('head', self.base_url).close()
+            return
+        # Take the pool that requests itself will use for the api, it depends on the TLS settings and proxies
+        request = self.session.prepare_request(requests.Request('get', self.base_url))
+        settings = self.session.merge_environment_settings(request.url, {}, None, None, None)
+        adapter = self.session.get_adapter(request.url)
+        if hasattr(adapter, 'get_connection_with_tls_context'):
+            pool = adapter.get_connection_with_tls_context(request, settings['verify'], settings['proxies'],
+                                                           settings['cert'])
+        else:
+            pool = adapter.get_connection(request.url, settings['proxies'])
+        if not (hasattr(pool, '_get_conn') and hasattr(pool, '_put_conn')):
+            return
+        opened = [pool._get_conn() for _ in range(connections)]
+        try:
+            with ThreadPoolExecutor(len(opened)) as executor:
+                list(executor.map(lambda connection: connection.sock or connection.connect(), opened))
+        except (OSError, urllib3.exceptions.HTTPError) as error:
+            raise requests.ConnectionError(error) from error
+        finally:
+            for connection in opened:
+                pool._put_conn(connection)
+
+    def _with_fields(self, method, path, data):
+        """
+        Add the default fields_include/fields_exclude of the endpoint to the parameters of a GET request.
+        :return: parameters to send
+        :rtype: dict
+        """
+        if method != 'get':
+            return data
+        data = dict(data or {})
+        for name, defaults in (('fields_include', self.fields_include), ('fields_exclude', self.fields_exclude)):
+            if name not in data and path in defaults:
+                data[name] = defaults[path]
+        return data
+
+    def _build_url(self, method, path, data, path_params):
+        """
+        Full url of a request. GET parameters go into a canonical query string instead of the body,
+        so the server sees them and caches can key on the url.
+        :return: url and the data left for the request body
+        :rtype: tuple
+        """
+        url = self.base_url + path.format(**path_params)
+        if method == 'get' and data:
+            params = _query_params(data)
+            return (url + '?' + urlencode(params) if params else url), None
+        return url, data
+
+    def _rate_limit_delay(self, path):
+        """
+        Reserve a slot in the global and the endpoint budget.
+        :param path: path template of the request
+        :return: seconds to wait before sending the request
+        :rtype: float
+        """
+        delay = 0.0
+        if self.rate_limiter:
+            delay = self.rate_limiter.reserve()
+        if path in self.endpoint_limiters:
+            delay = max(delay, self.endpoint_limiters[path].reserve())
+        return delay
+
+    def _timeout(self, path):
+        """
+        :param path: path template of the request
+        :return: timeout of the endpoint, cut down to the time left before the deadline
+        """
+        timeout = self.endpoint_timeouts.get(path, self.timeout)
+        left = _time_left()
+        if left is None:
+            return timeout
+        if not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        return tuple(left if part is None else min(part, left) for part in timeout)
+
+    def _count_active(self, stats, change):
+        """
+        Count the requests in flight, for CallStats.pool_in_use.
+        :param stats: CallStats of the call sending or finishing a request
+        :param change: 1 when a request is sent, -1 when it is done
+        """
+        with self.in_flight_lock:
+            self.active_requests += change
+            if change > 0:
+                stats.pool_in_use = max(stats.pool_in_use, self.active_requests)
+                stats.pool_size = self.max_connections
+
+    @contextlib.contextmanager
+    def _instrument(self, method, path):
+        """
+        Collect the CallStats of the call made inside the block and hand them to the sinks,
+        and trace the call in a span if there is a tracer. Does nothing if there are neither.
+        """
+        if not self.sinks and self.tracer is None:
+            yield
+            return
+        stats = CallStats(method, path)
+        span = self._start_span(stats) if self.tracer is not None else None
+        token = _call_stats.set(stats)
+        try:
+            with otel_trace.use_span(span, record_exception=False,
+                                     set_status_on_exception=False) if span else contextlib.nullcontext():
+                yield
+        except BaseException as error:
+            stats.error = error
+            raise
+        finally:
+            _call_stats.reset(token)
+            stats.total = time.perf_counter() - stats.started
+            if span is not None:
+                self._end_span(span, stats)
+            for sink in self.sinks:
+                try:
+                    sink(stats)
+                except Exception:
+                    logging.getLogger('LolzApi').exception('Sink %r failed', sink)
+
+    def _start_span(self, stats):
+        return self.tracer.start_span(stats.endpoint, kind=otel_trace.SpanKind.CLIENT, attributes={
+            'http.request.method': stats.method, 'url.template': stats.path,
+            'server.address': urlsplit(self.base_url).hostname})
+
+    def _end_span(self, span, stats):
+        """
+        Add the outcome of the call to its span and end it.
+        """
+        if stats.status is not None:
+            span.set_attribute('http.response.status_code', stats.status)
+        span.set_attribute('lolzapi.attempts', stats.attempts)
+        if stats.attempts > 1:
+            span.set_attribute('http.request.resend_count', stats.attempts - 1)
+        if stats.cache is not None:
+            span.set_attribute('lolzapi.cache', stats.cache)
+        if stats.shared:
+            span.set_attribute('lolzapi.shared', True)
+        if stats.error is not None:
+            span.record_exception(stats.error)
+            span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR, type(stats.error).__name__))
+        elif stats.status is not None and stats.status >= 400:
+            span.set_status(otel_trace.Status(otel_trace.StatusCode.ERROR))
+        span.end()
+
+    def _request(self, method, path, data=None, files=None, json_body=None, **path_params):
+        """
+        Send a request to the API and decode the json answer.
+        Every endpoint method goes through here.
+        :param method: http method, 'get', 'post', 'put' or 'delete'
+        :param path: path template relative to base_url, e.g. 'threads/{threadID}'
+        :param data:
+        :param files:
+        :param json_body: sent as a json body instead of data
+        :param path_params: values for the placeholders of the path template
+        :return:
+        :rtype: json
+        """
+        with self._instrument(method, path):
+            url, data = self._build_url(method, path, self._with_fields(method, path, data), path_params)
+            key, ttl, content = self._cache_lookup(method, path, url, data)
+            if content is not None:
+                return self._decode(content)
+            # A call with a deadline doesn't share its request, so the deadline can't fail other callers
+            if self.coalesce and method == 'get' and _deadline.get() is None:
+                content = self._single_flight(_cache_key(method, url, data), self._fetch,
+                                              method, path, url, data, files, json_body, key, ttl)
+            else:
+                content = self._fetch(method, path, url, data, files, json_body, key, ttl)
+            return self._decode(content)
+
+    def _fetch(self, method, path, url, data, files, json_body, key, ttl):
+        """
+        Send a request that missed the cache, revalidating and storing it if it is cacheable.
+        :return: answer body
+        :rtype: bytes
+        """
+        stale, headers = self._cache_validators(key)
+        response = self._send(method, path, url, data=data, files=files, json=json_body, headers=headers)
+        return self._cache_store(key, path, ttl, response, stale)
+
+    def _single_flight(self, key, fetch, *args):
+        """
+        Run fetch(*args) once for all callers asking for the same key at the same time.
+        The first caller sends the request, the others wait for its answer.
+        :param key: key from _cache_key
+        :return: result of fetch
+        """
+        with self.in_flight_lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+        if not leader:
+            stats = _call_stats.get()
+            if stats is not None:
+                stats.shared = True
+            return future.result()
+        try:
+            future.set_result(fetch(*args))
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[key]
+        return future.result()
+
+    def _decode(self, content):
+        """
+        :param content: answer body
+        :return: the decoded answer, or a LazyResponse if the client is lazy
+        :rtype: json
+        """
+        decoder = self._decode_models if self.models else self.json_decoder
+        if self.lazy:
+            return LazyResponse(content, decoder)
+        stats = _call_stats.get()
+        if stats is None:
+            return decoder(content)
+        started = time.perf_counter()
+        try:
+            return decoder(content)
+        finally:
+            stats.decode += time.perf_counter() - started
+
+    def _decode_models(self, content):
+        return _with_models(self.json_decoder(content))
+
+    def _cache_lookup(self, method, path, url, data):
+        """
+        :return: cache key, ttl of the endpoint and the fresh cached body.
+            The key is None if the request is not cacheable, the body is None on a miss.
+        """
+        if self.cache is None or method != 'get':
+            return None, None, None
+        ttl = self.cache.ttl(path)
+        if ttl is None:
+            return None, None, None
+        key = _cache_key(method, url, data)
+        content = self.cache.get(key)
+        stats = _call_stats.get()
+        if stats is not None:
+            stats.cache = 'miss' if content is None else 'hit'
+        return key, ttl, content
+
+    def _cache_validators(self, key):
+        """
+        :param key: key from _cache_lookup
+        :return: the stale cached answer and the conditional headers to revalidate it,
+            (None, None) if there is nothing to revalidate
+        """
+        stale = self.cache.get_stale(key) if key is not None else None
+        if stale is None:
+            return None, None
+        headers = {}
+        if stale[1]:
+            headers['If-None-Match'] = stale[1]
+        if stale[2]:
+            headers['If-Modified-Since'] = stale[2]
+        return stale, headers
+
+    def _cache_store(self, key, path, ttl, response, stale):
+        """
+        Put a successful answer in the cache, or serve the stale one if the server answered 304.
+        :return: body to decode
+        :rtype: bytes
+        """
+        if key is None:
+            return response.content
+        if response.status_code == 304 and stale is not None:
+            self.cache.refresh(key, ttl)
+            stats = _call_stats.get()
+            if stats is not None:
+                stats.cache = 'revalidated'
+            return stale[0]
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        # An answer that expires at once is only worth keeping for revalidation,
+        # without validators it would just push fresh answers out of the cache
+        if response.status_code == 200 and (ttl > 0 or etag or last_modified):
+            self.cache.set(key, path, response.content, ttl, etag, last_modified)
+        return response.content
+
+    def _send(self, method, path, url, stream=False, **kwargs):
+        """
+        Send a request through the rate limiter, retrying it according to retry_policy.
+        :param method:
+        :param path: path template, used to pick the rate limit budget
+        :param url:
+        :param stream: don't read the body yet
+        :param kwargs: passed to session.request
+        :return:
+        :rtype: requests.Response
+        """
+        stats = _call_stats.get()
+        key, recorded = self._cassette_lookup(method, path, url, kwargs)
+        if recorded is not None:
+            return self._replay(method, url, recorded, stats, stream)
+        attempt = 0
+        while True:
+            attempt += 1
+            delay = self._rate_limit_delay(path)
+            if delay:
+                time.sleep(_within_deadline(delay))
+                if stats is not None:
+                    stats.limiter_wait += delay
+            if stats is not None:
+                stats.start_attempt()
+                self._count_active(stats, 1)
+            try:
+                response = self.session.request(method, url, stream=stream, timeout=self._timeout(path), **kwargs)
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ContentDecodingError):
+                if stats is not None:
+                    stats.end_attempt(None)
+                # A timeout cut short by the deadline is raised as DeadlineExceeded
+                _time_left()
+                if not self.retry_policy.should_retry(method, attempt):
+                    raise
+                time.sleep(_within_deadline(self.retry_policy.delay(attempt)))
+                continue
+            finally:
+                if stats is not None:
+                    self._count_active(stats, -1)
+            if stats is not None:
+                stats.end_attempt(response.status_code, response.elapsed.total_seconds(),
+                                  response.request.headers.get('Content-Length'), None if stream else response.content)
+            delay = None
+            if self.retry_policy.should_retry(method, attempt, response.status_code):
+                delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+            if delay is None:
+                if key is not None:
+                    return self._record(key, response, stream, response.elapsed.total_seconds())
+                return response
+            response.close()
+            time.sleep(_within_deadline(delay))
+
+    def _cassette_lookup(self, method, path, url, kwargs):
+        """
+        :param path: path template of the request
+        :param kwargs: arguments of _send
+        :return: cassette key of the request (None if it is not recorded)
+            and its recorded answer (None if the request has to be sent)
+        :rtype: tuple
+        """
+        if self.cassette is None:
+            return None, None
+        key = None
+        if self.cassette.replays(method, path, kwargs.get('json')):
+            key = _replay_key(method, url, kwargs)
+        if key is None:
+            if self.cassette.mode == 'replay':
+                raise CassetteMiss(f'{method.upper()} {url} can not be replayed')
+            return None, None
+        return key, self.cassette.lookup(key)
+
+    def _record(self, key, response, stream, elapsed):
+        """
+        Record the final answer of a request into the cassette. A streamed answer is recorded
+        while the caller reads it.
+        :return: the answer to hand to the caller
+        """
+        if not self.cassette.records(response.status_code):
+            return response
+        recorder = self.cassette.recorder(key, response.status_code, response.headers, elapsed)
+        if stream:
+            return _RecordingResponse(response, recorder)
+        recorder.write(response.content)
+        recorder.finish()
+        return response
+
+    def _replay(self, method, url, recorded, stats, stream=False):
+        """
+        Answer a request from the cassette after its simulated latency.
+        :param recorded: (status, headers, size, elapsed, recording) from Cassette.lookup
+        :param stats: CallStats of the call, None if it is not instrumented
+        :param stream: read the body part by part as the caller consumes it
+        :rtype: requests.Response
+        """
+        status, headers, size, elapsed, recording = recorded
+        delay = self.cassette.delay(elapsed)
+        if stats is not None:
+            stats.start_attempt()
+        if delay:
+            time.sleep(_within_deadline(delay))
+        response = requests.Response()
+        response.status_code = status
+        response.headers = requests.structures.CaseInsensitiveDict(headers, **{'Content-Length': str(size)})
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        parts = self.cassette.content(recording)
+        response.raw = io.BufferedReader(_PartsReader(parts)) if stream else io.BytesIO(b''.join(parts))
+        response.url = url
+        response.request = requests.Request(method.upper(), url).prepare()
+        response.elapsed = datetime.timedelta(seconds=delay)
+        if stats is not None:
+            stats.end_attempt(status, delay, None, None if stream else response.content)
+        return response
 
-    def get_categories(self, parent_category_id=None, parent_forum_id=None, order=None):
+    def _upload(self, path, name, file, data, progress=None, **path_params):
+        """
+        Upload a file as a streamed multipart/form-data body.
+        Uploads are POST requests, so the default retry_policy does not repeat them.
+        :param path: path template
+        :param name: form field of the file
+        :param file: binary file object or path to it
+        :param data: other form fields
+        :param progress: callback progress(sent_bytes, total_bytes)
+        :param path_params:
+        :return:
+        :rtype: json
+        """
+        body = _MultipartStream(data, name, file, progress)
+        try:
+            with self._instrument('post', path):
+                content = self._send('post', path, self.base_url + path.format(**path_params), data=body,
+                                     headers={'Content-Type': body.content_type,
+                                              'Content-Length': str(len(body))}).content
+                return self._decode(content)
+        finally:
+            body.close()
+
+    def batch(self):
+        """
+        Collect calls and send them as one POST /batch request when the block ends:
+            with api.batch() as batch:
+                user = batch.get_user_detail(1)
+                thread = batch.get_thread_detail(2)
+            print(user.result(), thread.result())
+        With AsyncLolzApi use `async with api.batch() as batch`.
+        :rtype: Batch
+        """
+        return Batch(self)
+
+    def deadline(self, seconds):
+        """
+        Limit the total time of all calls made inside the block, including pagination and retries:
+            with api.deadline(10):
+                for thread in api.iter_threads(forum_id=876):
+                    ...
+        Raises DeadlineExceeded once the time runs out. Use `async with` for AsyncLolzApi.
+        :param seconds: time budget in seconds
+        :rtype: Deadline
+        """
+        return Deadline(seconds)
+
+    def upload_many(self, upload, files, max_concurrency=4, **kwargs):
+        """
+        Run several uploads at once, at most max_concurrency at a time:
+            api.upload_many(api.upload_attachment_post, ['1.png', '2.png'], thread_id=1, attachment_hash=h)
+        :param upload: upload method, e.g. api.upload_attachment_post
+        :param files: files or paths to upload
+        :param max_concurrency: max number of uploads in flight
+        :param kwargs: passed to every upload
+        :return: answers in the order of files
+        :rtype: list
+        """
+        # Uploads run in other threads, make them see the deadline of the caller
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_concurrency) as pool:
+            return list(pool.map(lambda file: context.copy().run(upload, file, **kwargs), files))
+
+    def _download(self, path, sink=None, data=None, chunk_size=64 * 1024, resume=False, **path_params):
+        """
+        Stream a binary answer into `sink` chunk by chunk, without holding the whole body in memory.
+        If the connection drops, the download continues with a Range request from the last written byte,
+        guarded by If-Range so a body that changed meanwhile is downloaded again from the start.
+        :param path: path template
+        :param sink: file path or binary file-like object. None returns the body as bytes.
+        :param data:
+        :param chunk_size: bytes per read
+        :param resume: continue an existing file at the sink path with a Range request instead of overwriting it.
+            Only use it for files left over by an earlier download of the same attachment.
+        :param path_params:
+        :return: {'size', 'content_type', 'content_length', 'resumed'}, the body if sink is None,
+            or the error json
+        """
+        url, data = self._build_url('get', path, data, path_params)
+        download = _Download(sink, resume)
+        attempt = 0
+        try:
+            with self._instrument('get', path):
+                stats = _call_stats.get()
+                while True:
+                    attempt += 1
+                    response = self._send('get', path, url, data=data, headers=download.headers(), stream=True)
+                    received = time.perf_counter()
+                    try:
+                        if response.status_code == 416 and download.offset:
+                            if download.complete(response.headers):
+                                return download.result()
+                            # The file is longer than the answer, so it isn't a part of it
+                            download.restart()
+                            continue
+                        if response.status_code not in (200, 206):
+                            return self._decode(response.content)
+                        download.start(response.status_code, response.headers)
+                        for chunk in response.iter_content(chunk_size):
+                            _time_left()
+                            download.write(chunk)
+                            if stats is not None:
+                                stats.response_bytes += len(chunk)
+                        return download.result()
+                    except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                        if not self.retry_policy.should_retry('get', attempt):
+                            raise
+                        time.sleep(_within_deadline(self.retry_policy.delay(attempt)))
+                    finally:
+                        response.close()
+                        if stats is not None:
+                            stats.download += time.perf_counter() - received
+        finally:
+            download.close()
+
+    def get_categories(self, parent_category_id=None, parent_forum_id=None, order=None,
+                       fields_include=None, fields_exclude=None):
         """
         List of all categories in the system.
         :param parent_category_id:
         :param parent_forum_id:
         :param order:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if parent_category_id: data['parent_category_id'] = parent_category_id
         if parent_forum_id: data['parent_forum_id'] = parent_forum_id
         if order: data['order'] = order
-        return self.session.get(
-            self.base_url + f'/categories', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'categories', data=data)
 
-    def get_category_detail(self, categoryID):
+    def get_category_detail(self, categoryID, fields_include=None, fields_exclude=None):
         """
         Detail information of a category.
         :param categoryID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'/categories/{categoryID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'categories/{categoryID}', data=data, categoryID=categoryID)
 
-    def get_forums(self, parent_category_id=None, parent_forum_id=None, order=None):
+    def get_forums(self, parent_category_id=None, parent_forum_id=None, order=None,
+                   fields_include=None, fields_exclude=None):
         """
         List of all forums in the system.
         :param parent_category_id:
         :param parent_forum_id:
         :param order:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if parent_category_id: data['parent_category_id'] = parent_category_id
         if parent_forum_id: data['parent_forum_id'] = parent_forum_id
         if order: data['order'] = order
-        return self.session.get(
-            self.base_url + f'/forums', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'forums', data=data)
 
-    def get_forum_detail(self, forumID):
+    def get_forum_detail(self, forumID, fields_include=None, fields_exclude=None):
         """
         Detail information of a category.
         :param forumID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'/forums/{forumID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'forums/{forumID}', data=data, forumID=forumID)
 
-    def get_forum_follower(self, forumID):
+    def get_forum_follower(self, forumID, fields_include=None, fields_exclude=None):
         """
         List of a forum's followers. For privacy reason, only the current user will be included in the list
         (if the user follows the specified forum).
         Since forum-2014053001.
         :param forumID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'forums/{forumID}/followers').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'forums/{forumID}/followers', data=data, forumID=forumID)
 
     def follow_forum(self, forumID, post=None, alert=None, email=None):
         """
@@ -77,7 +2828,7 @@ class LolzApi:
         if post: data['post'] = post
         if alert: data['alert'] = alert
         if email: data['email'] = email
-        return self.session.post(self.base_url + f'forums/{forumID}/followers', data=data).json()
+        return self._request('post', 'forums/{forumID}/followers', data=data, forumID=forumID)
 
     def unfollow_forum(self, forumID):
         """
@@ -85,51 +2836,68 @@ class LolzApi:
         :param forumID:
         :return:
         """
-        return self.session.delete(self.base_url + f'/forums/{forumID}/followers').json()
+        return self._request('delete', 'forums/{forumID}/followers', forumID=forumID)
 
-    def get_list_follow(self, total=None):
+    def get_list_follow(self, total=None, fields_include=None, fields_exclude=None):
         """
         List of followed forums by current user.
         Since forum-2014053001.
         :param total:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if total: data['total'] = total
-        return self.session.get(self.base_url + 'forums/followed', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'forums/followed', data=data)
 
-    def get_pages(self, parent_page_id=None, order=None):
+    def get_pages(self, parent_page_id=None, order=None, fields_include=None, fields_exclude=None):
         """
         List of all pages in the system.
         Since forum-2015072302.
         :param parent_page_id:
         :param order:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if parent_page_id: data['parent_page_id'] = parent_page_id
         if order: data['order'] = order
-        return self.session.get(self.base_url + 'pages', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'pages', data=data)
 
-    def get_pages_detail(self, pageID):
+    def get_pages_detail(self, pageID, fields_include=None, fields_exclude=None):
         """
         Detail information of a page.
         Since forum-2015072302.
         :param pageID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'pages/{pageID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'pages/{pageID}', data=data, pageID=pageID)
 
-    def get_navigation(self, parent=None):
+    def get_navigation(self, parent=None, fields_include=None, fields_exclude=None):
         """
         List of navigation elements within the system.
         Since forum-2015030601.
         :param parent:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if parent: data['parent'] = parent
-        return self.session.get(self.base_url + 'navigation', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'navigation', data=data)
 
     def get_threads(self, **kwargs):
         """
@@ -145,11 +2913,12 @@ class LolzApi:
         :param order:
         :param thread_create_date:
         :param thread_update_date:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = kwargs
-        print(data)
-        return self.session.get(self.base_url + 'threads', data=data).json()
+        return self._request('get', 'threads', data=data)
 
     def create_thread(self, forum_id, thread_title, post_body, thread_prefix_id=None, thread_tags=None):
         """
@@ -164,19 +2933,20 @@ class LolzApi:
         data = {'forum_id': forum_id, 'thread_title': thread_title, 'post_body': post_body}
         if thread_prefix_id: data['thread_prefix_id'] = thread_prefix_id
         if thread_tags: data['thread_tags'] = thread_tags
-        return self.session.post(self.base_url + 'threads', data=data).json()
+        return self._request('post', 'threads', data=data)
 
-    def thread_attachment(self, file, forum_id, attachment_hash=None):
+    def thread_attachment(self, file, forum_id, attachment_hash=None, progress=None):
         """
         Upload an attachment for a thread.
-        :param file: binary file open('file', 'rb')
+        :param file: binary file open('file', 'rb') or path to it
         :param forum_id:
         :param attachment_hash:
+        :param progress: callback progress(sent_bytes, total_bytes)
         :return:
         """
-        data = {'file': file, 'forum_id': forum_id}
+        data = {'forum_id': forum_id}
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.post(self.base_url + 'threads/attachments', data=data).json()
+        return self._upload('threads/attachments', 'file', file, data, progress)
 
     def del_thread_attachment(self, forum_id, attachment_id, attachment_hash=None):
         """
@@ -188,15 +2958,20 @@ class LolzApi:
         """
         data = {'forum_id': forum_id, 'attachment_id': attachment_id}
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.delete(self.base_url + 'threads/attachments', data=data).json()
+        return self._request('delete', 'threads/attachments', data=data)
 
-    def get_thread_detail(self, threadID):
+    def get_thread_detail(self, threadID, fields_include=None, fields_exclude=None):
         """
         Detail information of a thread.
         :param threadID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'threads/{threadID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'threads/{threadID}', data=data, threadID=threadID)
 
     def delete_thread(self, threadID, reason=None):
         """
@@ -207,17 +2982,22 @@ class LolzApi:
         """
         data = {}
         if reason: data['reason'] = reason
-        return self.session.delete(self.base_url + f'threads/{threadID}', data=data).json()
+        return self._request('delete', 'threads/{threadID}', data=data, threadID=threadID)
 
-    def get_thread_followers(self, threadID):
+    def get_thread_followers(self, threadID, fields_include=None, fields_exclude=None):
         """
         List of a thread's followers.
         For privacy reason, only the current user will be included in the list (if the user follows the specified thread).
         The privacy change was put in place since forum-2014053001, earlier versions return all followers of the thread.
         :param threadID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'threads/{threadID}/followers').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'threads/{threadID}/followers', data=data, threadID=threadID)
 
     def follow_thread(self, threadID, email=None):
         """
@@ -228,7 +3008,7 @@ class LolzApi:
         """
         data = {}
         if email: data['email'] = email
-        return self.session.post(self.base_url + f'threads/{threadID}/followers', data=data).json()
+        return self._request('post', 'threads/{threadID}/followers', data=data, threadID=threadID)
 
     def unfollow_thread(self, threadID):
         """
@@ -236,36 +3016,50 @@ class LolzApi:
         :param threadID:
         :return:
         """
-        return self.session.delete(self.base_url + f'threads/{threadID}/followers').json()
+        return self._request('delete', 'threads/{threadID}/followers', threadID=threadID)
 
-    def get_list_follow_thread(self, total=None):
+    def get_list_follow_thread(self, total=None, fields_include=None, fields_exclude=None):
         """
         List of followed threads by current user.
         Since forum-2014053002.
         :param total:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if total: data['total'] = total
-        return self.session.get(self.base_url + 'threads/followed', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'threads/followed', data=data)
 
-    def get_list_navigation(self, threadID):
+    def get_list_navigation(self, threadID, fields_include=None, fields_exclude=None):
         """
         List of navigation elements to reach the specified thread.
         Since forum-2019052201.
         :param threadID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'threads/{threadID}/navigation').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'threads/{threadID}/navigation', data=data, threadID=threadID)
 
-    def get_poll_detail(self, threadID):
+    def get_poll_detail(self, threadID, fields_include=None, fields_exclude=None):
         """
         Detail information of a poll.
         Since forum-2020042601.
         :param threadID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'threads/{threadID}/poll').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'threads/{threadID}/poll', data=data, threadID=threadID)
 
     def vote_poll_thread(self, threadID, response_id, response_ids: tuple = None):
         """
@@ -278,29 +3072,36 @@ class LolzApi:
         """
         data = {'response_id': response_id}
         if response_ids: data['response_ids'] = response_ids
-        return self.session.post(self.base_url + f'threads/{threadID}/poll/votes', data=data).json()
+        return self._request('post', 'threads/{threadID}/poll/votes', data=data, threadID=threadID)
 
-    def get_new_threads(self, limit=None, forum_id=None, data_limit=None):
+    def get_new_threads(self, limit=None, forum_id=None, data_limit=None, fields_include=None, fields_exclude=None):
         """
         List of unread threads (must be logged in).
         :param limit:
         :param forum_id:
         :param data_limit:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if limit: data['limit'] = limit
         if forum_id: data['forum_id'] = forum_id
         if data_limit: data['data_limit'] = data_limit
-        return self.session.get(self.base_url + 'threads/new', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'threads/new', data=data)
 
-    def get_recent_threads(self, days=None, limit=None, forum_id=None, data_limit=None):
+    def get_recent_threads(self, days=None, limit=None, forum_id=None, data_limit=None,
+                           fields_include=None, fields_exclude=None):
         """
         List of recent threads.
         :param days:
         :param limit:
         :param forum_id:
         :param data_limit:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
@@ -308,9 +3109,12 @@ class LolzApi:
         if limit: data['limit'] = limit
         if forum_id: data['forum_id'] = forum_id
         if data_limit: data['data_limit'] = data_limit
-        return self.session.get(self.base_url + 'threads/recent', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'threads/recent', data=data)
 
-    def get_posts_thread(self, thread_id, page_of_post_id=None, post_ids=None, page=None, limit=None, order=None):
+    def get_posts_thread(self, thread_id, page_of_post_id=None, post_ids=None, page=None, limit=None, order=None,
+                         fields_include=None, fields_exclude=None):
         """
         List of posts in a thread (with pagination).
         :param thread_id:
@@ -319,6 +3123,8 @@ class LolzApi:
         :param page:
         :param limit:
         :param order:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
@@ -328,7 +3134,9 @@ class LolzApi:
         if page: data['page'] = page
         if limit: data['limit'] = limit
         if order: data['order'] = order
-        return self.session.get(self.base_url + 'posts', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'posts', data=data)
 
     def create_new_post(self, thread_id, quote_post_id=None, post_body=None):
         """
@@ -341,31 +3149,37 @@ class LolzApi:
         data = {'thread_id': thread_id}
         if quote_post_id: data['quote_post_id'] = quote_post_id
         if post_body: data['post_body'] = post_body
-        return self.session.post(self.base_url + 'posts', data=data).json()
+        return self._request('post', 'posts', data=data)
 
-    def upload_attachment_post(self, file, thread_id=None, post_id=None, attachment_hash=None):
+    def upload_attachment_post(self, file, thread_id=None, post_id=None, attachment_hash=None, progress=None):
         """
         Upload an attachment for a post.
         The attachment will be associated after the post is saved.
-        :param file:
+        :param file: binary file open('file', 'rb') or path to it
         :param thread_id:
         :param post_id:
         :param attachment_hash:
+        :param progress: callback progress(sent_bytes, total_bytes)
         :return:
         """
-        data = {'file': file}
+        data = {}
         if thread_id: data['thread_id'] = thread_id
         if post_id: data['post_id'] = post_id
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.post(self.base_url + 'posts/attachments', data=data).json()
+        return self._upload('posts/attachments', 'file', file, data, progress)
 
-    def get_post_detail(self, postID):
+    def get_post_detail(self, postID, fields_include=None, fields_exclude=None):
         """
         Detail information of a post.
         :param postID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'posts/{postID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'posts/{postID}', data=data, postID=postID)
 
     def edit_post(self, postID, post_body, thread_title=None, thread_prefix_id=None, thread_tags=None,
                   thread_node_id=None):
@@ -384,7 +3198,7 @@ class LolzApi:
         if thread_prefix_id: data['thread_prefix_id'] = thread_prefix_id
         if thread_tags: data['thread_tags'] = thread_tags
         if thread_node_id: data['thread_node_id'] = thread_node_id
-        return self.session.put(self.base_url + f'posts/{postID}', data=data).json()
+        return self._request('put', 'posts/{postID}', data=data, postID=postID)
 
     def delete_post(self, postID, reason=None):
         """
@@ -395,15 +3209,20 @@ class LolzApi:
         """
         data = {}
         if reason: data['reason'] = reason
-        return self.session.delete(self.base_url + f'posts/{postID}', data=data).json()
+        return self._request('delete', 'posts/{postID}', data=data, postID=postID)
 
-    def get_list_attachments_post(self, postID):
+    def get_list_attachments_post(self, postID, fields_include=None, fields_exclude=None):
         """
         List of attachments of a post.
         :param postID:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + f'posts/{postID}/attachments').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'posts/{postID}/attachments', data=data, postID=postID)
 
     def get_binary_attachments_post(self, postID, attachmentID, max_width=None, max_height=None, keep_ratio=None):
         """
@@ -414,12 +3233,32 @@ class LolzApi:
         :param max_height:
         :param keep_ratio:
         :return:
+        :rtype: bytes
+        """
+        return self.download_attachment_post(postID, attachmentID, None, max_width, max_height, keep_ratio)
+
+    def download_attachment_post(self, postID, attachmentID, sink, max_width=None, max_height=None, keep_ratio=None,
+                                 chunk_size=64 * 1024, resume=False):
+        """
+        Stream a post's attachment into a file in chunks.
+        A dropped connection is resumed from where it stopped.
+        :param postID:
+        :param attachmentID:
+        :param sink: file path or binary file-like object
+        :param max_width:
+        :param max_height:
+        :param keep_ratio:
+        :param chunk_size:
+        :param resume: continue an unfinished file left by an earlier download instead of overwriting it
+        :return: {'size', 'content_type', 'content_length', 'resumed'}
+        :rtype: json
         """
         data = {}
         if max_width: data['max_width'] = max_width
         if max_height: data['max_height'] = max_height
         if keep_ratio: data['keep_ratio'] = keep_ratio
-        return self.session.get(self.base_url + f'posts/{postID}/attachments/{attachmentID}', data=data).json()
+        return self._download('posts/{postID}/attachments/{attachmentID}', sink, data=data, chunk_size=chunk_size,
+                              resume=resume, postID=postID, attachmentID=attachmentID)
 
     def delete_post_attachment(self, postID, attachmentID, thread_id=None, attachment_hash=None):
         """
@@ -433,20 +3272,25 @@ class LolzApi:
         data = {}
         if thread_id: data['thread_id'] = thread_id
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.delete(self.base_url + f'posts/{postID}/attachments/{attachmentID}', data=data).json()
+        return self._request('delete', 'posts/{postID}/attachments/{attachmentID}', data=data, postID=postID,
+                             attachmentID=attachmentID)
 
-    def get_list_liked_post(self, postID, page=None, limit=None):
+    def get_list_liked_post(self, postID, page=None, limit=None, fields_include=None, fields_exclude=None):
         """
         List of users who liked a post.
         :param postID:
         :param page:
         :param limit:
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.get(self.base_url + f'posts/{postID}/likes', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'posts/{postID}/likes', data=data, postID=postID)
 
     def like_post(self, postID):
         """
@@ -454,7 +3298,7 @@ class LolzApi:
         :param postID:
         :return:
         """
-        return self.session.post(self.base_url + f'posts/{postID}/likes').json()
+        return self._request('post', 'posts/{postID}/likes', postID=postID)
 
     def unlike_post(self, postID):
         """
@@ -462,7 +3306,7 @@ class LolzApi:
         :param postID:
         :return:
         """
-        return self.session.delete(self.base_url + f'posts/{postID}/likes').json()
+        return self._request('delete', 'posts/{postID}/likes', postID=postID)
 
     def report_post(self, postID, message):
         """
@@ -473,18 +3317,22 @@ class LolzApi:
         """
         data = {}
         if message: data['message'] = message
-        return self.session.post(self.base_url + f'posts/{postID}/report', data=data).json()
+        return self._request('post', 'posts/{postID}/report', data=data, postID=postID)
 
-    def get_list_comments(self, postID, before=None):
+    def get_list_comments(self, postID, before=None, fields_include=None, fields_exclude=None):
         """
         List of post comments in a thread (with pagination).
         :param postID:
         :param before: The time in milliseconds (e.g. 1652177794083) before last comment date
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
         data = {}
         if before: data['before'] = before
-        return self.session.get(self.base_url + f'posts/{postID}/comments').json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'posts/{postID}/comments', data=data, postID=postID)
 
     def create_new_comment(self, postID, comment_body):
         """
@@ -497,26 +3345,36 @@ class LolzApi:
         :rtype: json
         """
         data = {'comment_body': comment_body}
-        return self.session.post(self.base_url + f'posts/{postID}/comments', data=data).json()
+        return self._request('post', 'posts/{postID}/comments', data=data, postID=postID)
 
-    def get_popular_tags(self):
+    def get_popular_tags(self, fields_include=None, fields_exclude=None):
         """
         List of popular tags (no pagination).
         Since forum-2015091002.
+        :param fields_include:
+        :param fields_exclude:
         :return:
         """
-        return self.session.get(self.base_url + 'tags').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'tags', data=data)
 
-    def get_list_tags(self):
+    def get_list_tags(self, fields_include=None, fields_exclude=None):
         """
         List of tags.
         Since forum-2017111101.
+        :param fields_include:
+        :param fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + 'tags/list').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'tags/list', data=data)
 
-    def get_list_tagged(self, tagID, page=None, limit=None):
+    def get_list_tagged(self, tagID, page=None, limit=None, fields_include=None, fields_exclude=None):
         """
         List of tagged contents.
         Since forum-2017050201.
@@ -526,40 +3384,58 @@ class LolzApi:
         :type page:
         :param limit:
         :type limit:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
         data = {}
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.get(self.base_url + f'tags/{tagID}', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'tags/{tagID}', data=data, tagID=tagID)
 
-    def get_filtered_tags(self, tag):
+    def get_filtered_tags(self, tag, fields_include=None, fields_exclude=None):
         """
         Filtered list of tags.
         Since forum-2015091002.
         :param tag:
         :type tag:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
         data = {'tag': tag}
-        return self.session.get(self.base_url + 'tags/find', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'tags/find', data=data)
 
-    def get_users(self, page=None, limit=None):
+    def get_users(self, page=None, limit=None, fields_include=None, fields_exclude=None):
         """
         List of users (with pagination).
         :param page:
         :type page:
         :param limit:
         :type limit:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
         data = {}
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.get(self.base_url + 'users', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users', data=data)
 
     def create_new_user(self, **kwargs):
         """
@@ -590,18 +3466,23 @@ class LolzApi:
         :rtype: json
         """
         data = kwargs
-        return self.session.post(self.base_url + 'users', data=data).json()
+        return self._request('post', 'users', data=data)
 
-    def get_user_fields(self):
+    def get_user_fields(self, fields_include=None, fields_exclude=None):
         """
         List of user fields.
         Since forum-2017122801.
+        :param fields_include:
+        :param fields_exclude:
         :return:
         :rtype:
         """
-        return self.session.get(self.base_url + 'users/fields').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/fields', data=data)
 
-    def get_filtered_users(self, username=None, user_email=None):
+    def get_filtered_users(self, username=None, user_email=None, fields_include=None, fields_exclude=None):
         """
         Filtered list of users by username or email.
         Since forum-2015030901.
@@ -609,25 +3490,38 @@ class LolzApi:
         :type username:
         :param user_email:
         :type user_email:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype:
         """
         data = {}
         if username: data['username'] = username
         if user_email: data['user_email'] = user_email
-        return self.session.get(self.base_url + 'users/find', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/find', data=data)
 
-    def get_user_detail(self, userID=None, shortLink=None):
+    def get_user_detail(self, userID=None, shortLink=None, fields_include=None, fields_exclude=None):
         """
         Detail information of a user.
         :param userID:
         :type userID:
         :param shortLink:
         :type shortLink:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'users/{userID if userID else shortLink}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/{userID}', data=data, userID=userID if userID else shortLink)
 
     def edit_user(self, userID, **kwargs):
         """
@@ -664,7 +3558,7 @@ class LolzApi:
         :rtype: json
         """
         data = kwargs
-        return self.session.put(self.base_url + f'users/{userID}', data=data).json()
+        return self._request('put', 'users/{userID}', data=data, userID=userID)
 
     def password_reset(self, oauth_token, username=None, email=None):
         """
@@ -682,20 +3576,21 @@ class LolzApi:
         data = {'oauth_token': oauth_token}
         if username: data['username'] = username
         if email: data['email'] = email
-        return self.session.post(self.base_url + 'lost-password', data=data).json()
+        return self._request('post', 'lost-password', data=data)
 
-    def upload_avatar(self, userID, avatar):
+    def upload_avatar(self, userID, avatar, progress=None):
         """
         Upload avatar for a user.
         :param userID:
         :type userID:
-        :param avatar:
+        :param avatar: binary file open('file', 'rb') or path to it
         :type avatar:
+        :param progress: callback progress(sent_bytes, total_bytes)
+        :type progress:
         :return:
         :rtype: json
         """
-        data = {'avatar': avatar}
-        return self.session.post(self.base_url + f'users/{userID}/avatar', data=data).json()
+        return self._upload('users/{userID}/avatar', 'avatar', avatar, {}, progress, userID=userID)
 
     def delete_avatar(self, userID):
         """
@@ -705,9 +3600,9 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.delete(self.base_url + f'users/{userID}/avatar').json()
+        return self._request('delete', 'users/{userID}/avatar', userID=userID)
 
-    def get_followers(self, userID, order=None, page=None, limit=None):
+    def get_followers(self, userID, order=None, page=None, limit=None, fields_include=None, fields_exclude=None):
         """
         List of a user's followers
         :param userID:
@@ -718,6 +3613,10 @@ class LolzApi:
         :type page:
         :param limit:
         :type limit:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
@@ -725,7 +3624,9 @@ class LolzApi:
         if order: data['order'] = order
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.get(self.base_url + f'users/{userID}/followers', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/{userID}/followers', data=data, userID=userID)
 
     def follow_user(self, userID):
         """
@@ -735,7 +3636,7 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.post(self.base_url + f'users/{userID}/followers').json()
+        return self._request('post', 'users/{userID}/followers', userID=userID)
 
     def unfollow_user(self, userID):
         """
@@ -745,9 +3646,9 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.delete(self.base_url + f'users/{userID}/followers').json()
+        return self._request('delete', 'users/{userID}/followers', userID=userID)
 
-    def get_users_folowings(self, userID, order=None, page=None, limit=None):
+    def get_users_folowings(self, userID, order=None, page=None, limit=None, fields_include=None, fields_exclude=None):
         """
         List of users whom are followed by a user.
         :param userID:
@@ -758,6 +3659,10 @@ class LolzApi:
         :type page:
         :param limit:
         :type limit:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
@@ -765,20 +3670,28 @@ class LolzApi:
         if order: data['order'] = order
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.get(self.base_url + f'users/{userID}/followings', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/{userID}/followings', data=data, userID=userID)
 
-    def get_ignored(self, total=None):
+    def get_ignored(self, total=None, fields_include=None, fields_exclude=None):
         """
         List of a ignored users of current user.
         Since forum-2015072303.
         :param total:
         :type total:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
         data = {}
         if total: data['total'] = total
-        return self.session.get(self.base_url + 'users/ignored', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/ignored', data=data)
 
     def ignore_user(self, userID):
         """
@@ -789,7 +3702,7 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.post(self.base_url + f'users/{userID}/ignore').json()
+        return self._request('post', 'users/{userID}/ignore', userID=userID)
 
     def stop_ignore(self, userID):
         """
@@ -800,28 +3713,40 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.delete(self.base_url + f'users/{userID}/ignore').json()
+        return self._request('delete', 'users/{userID}/ignore', userID=userID)
 
-    def get_users_groups(self):
+    def get_users_groups(self, fields_include=None, fields_exclude=None):
         """
         List of all user groups. Since forum-2014092301.
+        :param fields_include:
+        :param fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + 'users/groups').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/groups', data=data)
 
-    def get_user_groups(self, userID):
+    def get_user_groups(self, userID, fields_include=None, fields_exclude=None):
         """
         List of a user's groups.
         Since forum-2014092301.
         :param userID:
         :type userID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'users/{userID}/groups').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/{userID}/groups', data=data, userID=userID)
 
-    def content_create_by_user(self, userID, page=None, limit=None):
+    def content_create_by_user(self, userID, page=None, limit=None, fields_include=None, fields_exclude=None):
         """
         List of contents created by user (with pagination).
         Since forum-2015042001.
@@ -831,13 +3756,19 @@ class LolzApi:
         :type page:
         :param limit:
         :type limit:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
         data = {}
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.get(self.base_url + f'users/{userID}/timeline', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'users/{userID}/timeline', data=data, userID=userID)
 
     def create_profile_post(self, userID, post_body, status=None):
         """
@@ -854,18 +3785,25 @@ class LolzApi:
         """
         data = {'post_body': post_body}
         if status: data['status'] = status
-        return self.session.post(self.base_url + f'users/{userID}/timeline', data=data).json()
+        return self._request('post', 'users/{userID}/timeline', data=data, userID=userID)
 
-    def get_profile_post_detail(self, profilePostID):
+    def get_profile_post_detail(self, profilePostID, fields_include=None, fields_exclude=None):
         """
         Detail information of a profile post.
         Since forum-2015042001.
         :param profilePostID:
         :type profilePostID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'profile-posts/{profilePostID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'profile-posts/{profilePostID}', data=data, profilePostID=profilePostID)
 
     def edit_profile_post(self, profilePostID, post_body):
         """
@@ -878,7 +3816,8 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.put(self.base_url, f'profile-posts/{profilePostID}', data={'post_body': post_body}).json()
+        return self._request('put', 'profile-posts/{profilePostID}', data={'post_body': post_body},
+                             profilePostID=profilePostID)
 
     def delete_profile_post(self, profilePostID, reason=None):
         """
@@ -893,18 +3832,25 @@ class LolzApi:
         """
         data = {}
         if reason: data['reason'] = reason
-        return self.session.delete(self.base_url + f'profile-posts/{profilePostID}', data=data).json()
+        return self._request('delete', 'profile-posts/{profilePostID}', data=data, profilePostID=profilePostID)
 
-    def get_users_likes_profile_post(self, profilePostID):
+    def get_users_likes_profile_post(self, profilePostID, fields_include=None, fields_exclude=None):
         """
         List of users who liked a profile post.
         Since forum-2015042001.
         :param profilePostID:
         :type profilePostID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'profile-posts/{profilePostID}/likes').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'profile-posts/{profilePostID}/likes', data=data, profilePostID=profilePostID)
 
     def like_profile_post(self, profilePostID):
         """
@@ -915,7 +3861,7 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.post(self.base_url + f'profile-posts/{profilePostID}/likes').json()
+        return self._request('post', 'profile-posts/{profilePostID}/likes', profilePostID=profilePostID)
 
     def unlike_profile_post(self, profilePostID):
         """
@@ -926,9 +3872,9 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.delete(self.base_url + f'profile-posts/{profilePostID}/likes').json()
+        return self._request('delete', 'profile-posts/{profilePostID}/likes', profilePostID=profilePostID)
 
-    def list_comments_profile_post(self, profilePostID, before=None):
+    def list_comments_profile_post(self, profilePostID, before=None, fields_include=None, fields_exclude=None):
         """
         List of comments of a profile post.
         Since forum-2015042001.
@@ -936,12 +3882,19 @@ class LolzApi:
         :type profilePostID:
         :param before:
         :type before:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
         data = {}
         if before: data['before'] = before
-        return self.session.get(self.base_url + f'profile-posts/{profilePostID}/comments').json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'profile-posts/{profilePostID}/comments', data=data,
+                             profilePostID=profilePostID)
 
     def new_profile_post_comment(self, profilePostID, comment_body):
         """
@@ -954,10 +3907,10 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.post(self.base_url + f'profile-posts/{profilePostID}/comments',
-                                 data={'comment_body': comment_body}).json()
+        return self._request('post', 'profile-posts/{profilePostID}/comments', data={'comment_body': comment_body},
+                             profilePostID=profilePostID)
 
-    def comment_profile_post_detail(self, profilePostID, commentID):
+    def comment_profile_post_detail(self, profilePostID, commentID, fields_include=None, fields_exclude=None):
         """
         Detail information of a profile post comment.
         Since forum-2015042001.
@@ -965,10 +3918,18 @@ class LolzApi:
         :type profilePostID:
         :param commentID:
         :type commentID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'profile-posts/{profilePostID}/comments/{commentID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'profile-posts/{profilePostID}/comments/{commentID}', data=data,
+                             profilePostID=profilePostID, commentID=commentID)
 
     def delete_profile_post_comment(self, profilePostID, commentID):
         """
@@ -982,7 +3943,8 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.delete(self.base_url + f'profile-posts/{profilePostID}/comments/{commentID}').json()
+        return self._request('delete', 'profile-posts/{profilePostID}/comments/{commentID}',
+                             profilePostID=profilePostID, commentID=commentID)
 
     def report_profile_post(self, profilePostID, message):
         """
@@ -996,32 +3958,45 @@ class LolzApi:
         :rtype: json
         """
         data = {'message': message}
-        return self.session.post(self.base_url + f'profile-posts/{profilePostID}/report', data=data).json()
+        return self._request('post', 'profile-posts/{profilePostID}/report', data=data, profilePostID=profilePostID)
 
-    def get_list_conservation(self, page=None, limit=None):
+    def get_list_conservation(self, page=None, limit=None, fields_include=None, fields_exclude=None):
         """
         List of conversations (with pagination).
         :param page:
         :type page:
         :param limit:
         :type limit:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
         data = {}
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.get(self.base_url + 'conversations', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'conversations', data=data)
 
-    def get_conservation_detail(self, conversationID):
+    def get_conservation_detail(self, conversationID, fields_include=None, fields_exclude=None):
         """
         Detail information of a conversation.
         :param conversationID:
         :type conversationID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'conversations/{conversationID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'conversations/{conversationID}', data=data, conversationID=conversationID)
 
     def delete_conservation(self, conversationID):
         """
@@ -1031,22 +4006,24 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.delete(self.base_url + f'conversations/{conversationID}').json()
+        return self._request('delete', 'conversations/{conversationID}', conversationID=conversationID)
 
-    def upload_attachment_conservation(self, file, attachment_hash=None):
+    def upload_attachment_conservation(self, file, attachment_hash=None, progress=None):
         """
         Upload an attachment for a conversation.
         Since forum-2014053003.
-        :param file:
+        :param file: binary file open('file', 'rb') or path to it
         :type file:
         :param attachment_hash:
         :type attachment_hash:
+        :param progress: callback progress(sent_bytes, total_bytes)
+        :type progress:
         :return:
         :rtype: json
         """
-        data = {'file': file}
+        data = {}
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.post(self.base_url + 'conversations/attachments', data=data).json()
+        return self._upload('conversations/attachments', 'file', file, data, progress)
 
     def delete_attachment_conservation(self, attachment_id, attachment_hash=None):
         """
@@ -1061,9 +4038,10 @@ class LolzApi:
         """
         data = {'attachment_id': attachment_id}
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.delete(self.base_url + 'conversations/attachments', data=data).json()
+        return self._request('delete', 'conversations/attachments', data=data)
 
-    def get_conservation_messages(self, conversation_id, page=None, limit=None, order=None, before=None, after=None):
+    def get_conservation_messages(self, conversation_id, page=None, limit=None, order=None, before=None, after=None,
+                                  fields_include=None, fields_exclude=None):
         """
         List of messages in a conversation (with pagination).
         :param conversation_id:
@@ -1078,6 +4056,10 @@ class LolzApi:
         :type before:
         :param after:
         :type after:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
@@ -1087,7 +4069,9 @@ class LolzApi:
         if order: data['order'] = order
         if before: data['before'] = before
         if after: data['after'] = after
-        return self.session.get(self.base_url + 'conversation-messages', data=data).json()
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'conversation-messages', data=data)
 
     def create_new_conservation(self, conversation_id, message_body):
         """
@@ -1102,15 +4086,15 @@ class LolzApi:
         data = {
             'conversation_id': conversation_id, 'message_body': message_body
         }
-        return self.session.post(self.base_url + 'conversation-messages', data=data).json()
+        return self._request('post', 'conversation-messages', data=data)
 
     def upload_attachments_conservation_message(self, file, conversation_id=None, message_id=None,
-                                                attachment_hash=None):
+                                                attachment_hash=None, progress=None):
         """
         Upload an attachment for a message.
         The attachment will be associated after the message is saved.
         Since forum-2014053003.
-        :param file:
+        :param file: binary file open('file', 'rb') or path to it
         :type file:
         :param conversation_id:
         :type conversation_id:
@@ -1118,24 +4102,33 @@ class LolzApi:
         :type message_id:
         :param attachment_hash:
         :type attachment_hash:
+        :param progress: callback progress(sent_bytes, total_bytes)
+        :type progress:
         :return:
         :rtype: json
         """
-        data = {'file': file}
+        data = {}
         if conversation_id: data['conversation_id'] = conversation_id
         if message_id: data['message_id'] = message_id
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.post(self.base_url + 'conversation-messages/attachments', data=data).json()
+        return self._upload('conversation-messages/attachments', 'file', file, data, progress)
 
-    def conservation_message_detail(self, messageID):
+    def conservation_message_detail(self, messageID, fields_include=None, fields_exclude=None):
         """
         Detail information of a message.
         :param messageID:
         :type messageID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'conversation-messages/{messageID}').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'conversation-messages/{messageID}', data=data, messageID=messageID)
 
     def edit_conservation_message(self, messageID, message_body):
         """
@@ -1151,7 +4144,7 @@ class LolzApi:
         data = {
             'message_body': message_body
         }
-        return self.session.put(self.base_url + f'conversation-messages/{messageID}', data=data).json()
+        return self._request('put', 'conversation-messages/{messageID}', data=data, messageID=messageID)
 
     def delete_conservation_message(self, messageID):
         """
@@ -1161,18 +4154,25 @@ class LolzApi:
         :return:
         :rtype: json
         """
-        return self.session.delete(self.base_url + f'conversation-messages/{messageID}').json()
+        return self._request('delete', 'conversation-messages/{messageID}', messageID=messageID)
 
-    def get_list_attachments_message(self, messageID):
+    def get_list_attachments_message(self, messageID, fields_include=None, fields_exclude=None):
         """
         List of attachments of a message.
         Since forum-2014053003.
         :param messageID:
         :type messageID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'conversation-messages/{messageID}/attachments').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'conversation-messages/{messageID}/attachments', data=data, messageID=messageID)
 
     def binary_attachments_message(self, messageID, attachmentID, max_width=None, max_height=None, keep_ratio=None):
         """
@@ -1189,14 +4189,40 @@ class LolzApi:
         :param keep_ratio:
         :type keep_ratio:
         :return:
+        :rtype: bytes
+        """
+        return self.download_attachment_message(messageID, attachmentID, None, max_width, max_height, keep_ratio)
+
+    def download_attachment_message(self, messageID, attachmentID, sink, max_width=None, max_height=None,
+                                    keep_ratio=None, chunk_size=64 * 1024, resume=False):
+        """
+        Stream a message's attachment into a file in chunks.
+        A dropped connection is resumed from where it stopped.
+        :param messageID:
+        :type messageID:
+        :param attachmentID:
+        :type attachmentID:
+        :param sink: file path or binary file-like object
+        :type sink:
+        :param max_width:
+        :type max_width:
+        :param max_height:
+        :type max_height:
+        :param keep_ratio:
+        :type keep_ratio:
+        :param chunk_size:
+        :type chunk_size:
+        :param resume: continue an unfinished file left by an earlier download instead of overwriting it
+        :type resume: bool
+        :return: {'size', 'content_type', 'content_length', 'resumed'}
         :rtype: json
         """
         data = {}
         if max_width: data['max_width'] = max_width
         if max_height: data['max_height'] = max_height
         if keep_ratio: data['keep_ratio'] = keep_ratio
-        return self.session.get(self.base_url + f'conversation-messages/{messageID}/attachments/{attachmentID}',
-                                data=data).json()
+        return self._download('conversation-messages/{messageID}/attachments/{attachmentID}', sink, data=data,
+                              chunk_size=chunk_size, resume=resume, messageID=messageID, attachmentID=attachmentID)
 
     def delete_message_attachments(self, messageID, attachmentID, conversation_id=None, attachment_hash=None):
         """
@@ -1216,8 +4242,8 @@ class LolzApi:
         data = {}
         if conversation_id: data['conversation_id'] = conversation_id
         if attachment_hash: data['attachment_hash'] = attachment_hash
-        return self.session.delete(self.base_url + f'conversation-messages/{messageID}/attachments/{attachmentID}',
-                                   data=data).json()
+        return self._request('delete', 'conversation-messages/{messageID}/attachments/{attachmentID}', data=data,
+                             messageID=messageID, attachmentID=attachmentID)
 
     def report_conservation_message(self, messageID, message):
         """
@@ -1231,28 +4257,40 @@ class LolzApi:
         :rtype: json
         """
         data = {"message": message}
-        return self.session.post(self.base_url + f'conversation-messages/{messageID}/report', data=data).json()
+        return self._request('post', 'conversation-messages/{messageID}/report', data=data, messageID=messageID)
 
-    def get_notifications(self):
+    def get_notifications(self, fields_include=None, fields_exclude=None):
         """
         List of notifications (both read and unread).
         Since forum-2014022602.
+        :param fields_include:
+        :param fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + 'notifications').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'notifications', data=data)
 
-    def get_notification_detail(self, notificationID):
+    def get_notification_detail(self, notificationID, fields_include=None, fields_exclude=None):
         """
         Get associated content of notification.
         The response depends on the content type.
         Since forum-2015041001.
         :param notificationID:
         :type notificationID:
+        :param fields_include:
+        :type fields_include:
+        :param fields_exclude:
+        :type fields_exclude:
         :return:
         :rtype: json
         """
-        return self.session.get(self.base_url + f'notifications/{notificationID}/content').json()
+        data = {}
+        if fields_include: data['fields_include'] = fields_include
+        if fields_exclude: data['fields_exclude'] = fields_exclude
+        return self._request('get', 'notifications/{notificationID}/content', data=data, notificationID=notificationID)
 
     def send_custom_alert(self, userid=None, username=None, message=None, message_html=None, notification_type=None,
                           extra_data=None):
@@ -1280,7 +4318,7 @@ class LolzApi:
         if message: data['message'] = message
         if message_html: data['message_html'] = message_html
         if notification_type: data['notification_type'] = notification_type
-        return self.session.post(self.base_url + 'notifications/custom', data=data).json()
+        return self._request('post', 'notifications/custom', data=data)
 
     def read_notification(self, notification_id=None):
         """
@@ -1294,7 +4332,7 @@ class LolzApi:
         """
         data = {}
         if notification_id: data['notification_id'] = notification_id
-        return self.session.post(self.base_url + 'notifications/read', data=data).json()
+        return self._request('post', 'notifications/read', data=data)
 
     def search_content(self, q, tag=None, forum_id=None, user_id=None, page=None, limit=None):
         """
@@ -1321,7 +4359,7 @@ class LolzApi:
         if user_id: data['user_id'] = user_id
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.post(self.base_url + 'search', data=data).json()
+        return self._request('post', 'search', data=data)
 
     def search_tag_content(self, tag, tags=None, page=None, limit=None):
         """
@@ -1342,4 +4380,479 @@ class LolzApi:
         if tags: data['tags'] = tags
         if page: data['page'] = page
         if limit: data['limit'] = limit
-        return self.session.post(self.base_url + 'search/tagged', data=data).json()
+        return self._request('post', 'search/tagged', data=data)
+
+    def _iter_pages(self, fetch, key, page=None, prefetch=0, **kwargs):
+        """
+        Walk a paginated endpoint from `page` until the last page, yielding items one at a time.
+        :param fetch: endpoint method that takes page=
+        :param key: key of the item list in the answer, e.g. 'threads'
+        :param page: page to start from
+        :param prefetch: how many next pages to fetch in parallel while the current one is consumed,
+            0 walks the pages one after another. Needs the page count from the first answer.
+        :param kwargs: passed to fetch
+        :return: generator of items
+        """
+        walk = _PageWalk(self.tracer, fetch, prefetch) if self.tracer is not None else None
+        if walk is not None:
+            fetch = walk
+        try:
+            page = page or 1
+            response = fetch(page=page, **kwargs)
+            last_page = _last_page(response, key, page) if prefetch else None
+            if last_page:
+                yield from self._iter_prefetched(fetch, key, response, page, last_page, prefetch, **kwargs)
+                return
+            seen = 0
+            while True:
+                items = _page_items(response, key)
+                yield from items
+                seen += len(items)
+                if not _has_next_page(response, items, key, seen):
+                    return
+                page += 1
+                response = fetch(page=page, **kwargs)
+        except Exception as error:
+            if walk is not None:
+                walk.end(error)
+                walk = None
+            raise
+        finally:
+            if walk is not None:
+                walk.end()
+
+    def _iter_prefetched(self, fetch, key, response, page, last_page, prefetch, **kwargs):
+        """
+        Yield the items of `response` and of the pages after it up to last_page,
+        keeping up to `prefetch` page requests in flight.
+        """
+        yield from _page_items(response, key)
+        pool = ThreadPoolExecutor(prefetch)
+        pending = collections.deque()
+        next_page = page + 1
+        try:
+            while True:
+                while next_page <= last_page and len(pending) < prefetch:
+                    pending.append(pool.submit(contextvars.copy_context().run, fetch, page=next_page, **kwargs))
+                    next_page += 1
+                if not pending:
+                    return
+                items = _page_items(pending.popleft().result(), key)
+                if not items:
+                    return
+                yield from items
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def iter_threads(self, **kwargs):
+        """
+        Iterate over threads of get_threads, walking all pages.
+        Takes the same parameters as get_threads, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of threads
+        """
+        return self._iter_pages(self.get_threads, 'threads', **kwargs)
+
+    def iter_posts_thread(self, thread_id, **kwargs):
+        """
+        Iterate over posts of get_posts_thread, walking all pages.
+        Takes the same parameters as get_posts_thread, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of posts
+        """
+        return self._iter_pages(self.get_posts_thread, 'posts', thread_id=thread_id, **kwargs)
+
+    def iter_users(self, **kwargs):
+        """
+        Iterate over users of get_users, walking all pages.
+        Takes the same parameters as get_users, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of users
+        """
+        return self._iter_pages(self.get_users, 'users', **kwargs)
+
+    def iter_followers(self, userID, **kwargs):
+        """
+        Iterate over followers of get_followers, walking all pages.
+        Takes the same parameters as get_followers, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of followers
+        """
+        return self._iter_pages(self.get_followers, 'users', userID=userID, **kwargs)
+
+    def iter_list_conservation(self, **kwargs):
+        """
+        Iterate over conversations of get_list_conservation, walking all pages.
+        Takes the same parameters as get_list_conservation, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of conversations
+        """
+        return self._iter_pages(self.get_list_conservation, 'conversations', **kwargs)
+
+    def iter_list_tagged(self, tagID, **kwargs):
+        """
+        Iterate over tagged contents of get_list_tagged, walking all pages.
+        Takes the same parameters as get_list_tagged, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of tagged contents
+        """
+        return self._iter_pages(self.get_list_tagged, 'tagged', tagID=tagID, **kwargs)
+
+    def iter_search_content(self, q, **kwargs):
+        """
+        Iterate over found contents of search_content, walking all pages.
+        Takes the same parameters as search_content, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of found contents
+        """
+        return self._iter_pages(self.search_content, 'data', q=q, **kwargs)
+
+    def iter_content_create_by_user(self, userID, **kwargs):
+        """
+        Iterate over contents of content_create_by_user, walking all pages.
+        Takes the same parameters as content_create_by_user, page is the page to start from.
+        prefetch=N fetches up to N next pages in parallel.
+        :return: generator of contents
+        """
+        return self._iter_pages(self.content_create_by_user, 'data', userID=userID, **kwargs)
+
+    def _stream(self, getter, key, *args, **kwargs):
+        """
+        Call an endpoint method, parsing its answer as it arrives and yielding the elements of the `key` list
+        one by one. Peak memory stays at about one element instead of the whole page.
+        Raises ApiError if the API answers with an error.
+        :param getter: endpoint method
+        :param key: key of the item list in the answer, e.g. 'posts'
+        :return: generator of items
+        """
+        return getter.__func__(_StreamingRequest(self, key), *args, **kwargs)
+
+    def _stream_items(self, method, path, key, data, path_params):
+        url, data = self._build_url(method, path, self._with_fields(method, path, data), path_params)
+        response = self._send(method, path, url, data=data, stream=True)
+        parser = _JsonArrayStream(key)
+        try:
+            if not 200 <= response.status_code < 300:
+                raise ApiError(response.status_code, _error_answer(self.json_decoder, response.content))
+            for chunk in response.iter_content(64 * 1024):
+                _time_left()
+                for item in parser.feed(chunk):
+                    yield self._decode_item(key, item)
+        finally:
+            response.close()
+
+    def _decode_item(self, key, content):
+        item = self.json_decoder(content)
+        if self.models and key in RESPONSE_MODELS and isinstance(item, dict):
+            return RESPONSE_MODELS[key](item)
+        return item
+
+    def stream_threads(self, **kwargs):
+        """
+        Same as get_threads, but yields the threads of the page one by one while the answer is still downloading.
+        Other parts of the answer (totals, links) are skipped.
+        :return: generator of threads
+        """
+        return self._stream(self.get_threads, 'threads', **kwargs)
+
+    def stream_posts_thread(self, thread_id, **kwargs):
+        """
+        Same as get_posts_thread, but yields the posts of the page one by one while the answer is still downloading.
+        Other parts of the answer (totals, links) are skipped.
+        :return: generator of posts
+        """
+        return self._stream(self.get_posts_thread, 'posts', thread_id, **kwargs)
+
+    def stream_users(self, **kwargs):
+        """
+        Same as get_users, but yields the users of the page one by one while the answer is still downloading.
+        Other parts of the answer (totals, links) are skipped.
+        :return: generator of users
+        """
+        return self._stream(self.get_users, 'users', **kwargs)
+
+    def stream_content_create_by_user(self, userID, **kwargs):
+        """
+        Same as content_create_by_user, but yields the contents of the page one by one while the answer is still downloading.
+        Other parts of the answer (totals, links) are skipped.
+        :return: generator of contents
+        """
+        return self._stream(self.content_create_by_user, 'data', userID, **kwargs)
+
+
+class AsyncLolzApi(LolzApi):
+    """
+    Asyncio version of LolzApi. It has the same methods, but every one of them returns a coroutine:
+        async with AsyncLolzApi(token) as api:
+            threads, posts = await asyncio.gather(api.get_threads(forum_id=876), api.get_posts_thread(1001))
+    All requests share one connection pool, so hundreds of calls can be in flight at once.
+    With http2=True they are multiplexed over a single connection.
+    Requires httpx (pip install httpx, or pip install httpx[http2] for http2=True).
+    """
+
+    def __init__(self, token, max_connections=100, max_keepalive_connections=20, **kwargs):
+        if httpx is None:
+            raise ImportError('AsyncLolzApi requires httpx, install it with "pip install httpx"')
+        self.max_keepalive_connections = max_keepalive_connections
+        super().__init__(token, max_connections=max_connections, **kwargs)
+
+    def _make_session(self):
+        return httpx.AsyncClient(
+            http2=self.http2,
+            headers={'Authorization': f'Bearer {self.token}'},
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_keepalive_connections if self.keep_alive else 0),
+            follow_redirects=True)
+
+    async def warmup(self, connections=1):
+        connections = min(connections, self.max_connections)
+        if not self.keep_alive or connections < 1:
+            return
+        if self.http2:
+            connections = 1
+        # Requests started together can't share a connection yet, so each one opens its own
+        responses = await asyncio.gather(*(self.session.request('HEAD', self.base_url) for _ in range(connections)))
+        for response in responses:
+            await response.aclose()
+
+    async def _request(self, method, path, data=None, files=None, json_body=None, **path_params):
+        with self._instrument(method, path):
+            url, data = self._build_url(method, path, self._with_fields(method, path, data), path_params)
+            key, ttl, content = self._cache_lookup(method, path, url, data)
+            if content is not None:
+                return self._decode(content)
+            if self.coalesce and method == 'get' and _deadline.get() is None:
+                content = await self._single_flight(_cache_key(method, url, data), self._fetch,
+                                                    method, path, url, data, files, json_body, key, ttl)
+            else:
+                content = await self._fetch(method, path, url, data, files, json_body, key, ttl)
+            return self._decode(content)
+
+    async def _fetch(self, method, path, url, data, files, json_body, key, ttl):
+        stale, headers = self._cache_validators(key)
+        response = await self._send(method, path, url, data=data, files=files, json=json_body, headers=headers)
+        return self._cache_store(key, path, ttl, response, stale)
+
+    async def _single_flight(self, key, fetch, *args):
+        task = self.in_flight.get(key)
+        if task is not None:
+            stats = _call_stats.get()
+            if stats is not None:
+                stats.shared = True
+        else:
+            # The fetch runs in a task of its own, so cancelling the caller that started it
+            # doesn't cancel it for the others waiting on the same answer
+            task = self.in_flight[key] = asyncio.ensure_future(fetch(*args))
+            task.add_done_callback(lambda done: self._end_flight(key, done))
+        return await asyncio.shield(task)
+
+    def _end_flight(self, key, task):
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        # Mark the exception as retrieved, every caller may have been cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def _send(self, method, path, url, stream=False, **kwargs):
+        stats = _call_stats.get()
+        key, recorded = self._cassette_lookup(method, path, url, kwargs)
+        if recorded is not None:
+            return await self._replay(method, url, recorded, stats, stream)
+        attempt = 0
+        while True:
+            attempt += 1
+            delay = self._rate_limit_delay(path)
+            if delay:
+                await asyncio.sleep(_within_deadline(delay))
+                if stats is not None:
+                    stats.limiter_wait += delay
+            left = _time_left()
+            if stats is not None:
+                trace = _Trace(stats)
+                kwargs['extensions'] = {'trace': trace.trace_async}
+                stats.start_attempt()
+                self._count_active(stats, 1)
+            try:
+                request = self.session.build_request(method.upper(), url, timeout=_httpx_timeout(self._timeout(path)),
+                                                     **kwargs)
+                sent = time.perf_counter()
+                response = await asyncio.wait_for(self.session.send(request, stream=stream), left)
+            except asyncio.TimeoutError as error:
+                raise DeadlineExceeded('deadline exceeded') from error
+            except (httpx.TransportError, httpx.DecodingError):
+                if stats is not None:
+                    stats.end_attempt(None)
+                _time_left()
+                if not self.retry_policy.should_retry(method, attempt):
+                    raise
+                await asyncio.sleep(_within_deadline(self.retry_policy.delay(attempt)))
+                continue
+            finally:
+                if stats is not None:
+                    self._count_active(stats, -1)
+            if stats is not None:
+                stats.end_attempt(response.status_code, trace.elapsed(), request.headers.get('Content-Length'),
+                                  None if stream else response.content)
+            delay = None
+            if self.retry_policy.should_retry(method, attempt, response.status_code):
+                delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+            if delay is None:
+                if key is not None:
+                    return self._record(key, response, stream, time.perf_counter() - sent)
+                return response
+            await response.aclose()
+            await asyncio.sleep(_within_deadline(delay))
+
+    async def _replay(self, method, url, recorded, stats, stream=False):
+        status, headers, size, elapsed, recording = recorded
+        delay = self.cassette.delay(elapsed)
+        if stats is not None:
+            stats.start_attempt()
+        if delay:
+            await asyncio.sleep(_within_deadline(delay))
+        parts = self.cassette.content(recording)
+        response = httpx.Response(status, headers=dict(headers, **{'Content-Length': str(size)}),
+                                  content=_aiter_parts(parts) if stream else b''.join(parts),
+                                  request=httpx.Request(method.upper(), url))
+        if stats is not None:
+            stats.end_attempt(status, delay, None, None if stream else response.content)
+        return response
+
+    async def _upload(self, path, name, file, data, progress=None, **path_params):
+        body = _MultipartStream(data, name, file, progress)
+        try:
+            with self._instrument('post', path):
+                response = await self._send('post', path, self.base_url + path.format(**path_params),
+                                            content=body.aiter_chunks(),
+                                            headers={'Content-Type': body.content_type,
+                                                     'Content-Length': str(len(body))})
+                return self._decode(response.content)
+        finally:
+            body.close()
+
+    async def upload_many(self, upload, files, max_concurrency=4, **kwargs):
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(file):
+            async with semaphore:
+                return await upload(file, **kwargs)
+
+        return await asyncio.gather(*[run(file) for file in files])
+
+    async def _download(self, path, sink=None, data=None, chunk_size=64 * 1024, resume=False, **path_params):
+        url, data = self._build_url('get', path, data, path_params)
+        download = _Download(sink, resume)
+        attempt = 0
+        try:
+            with self._instrument('get', path):
+                stats = _call_stats.get()
+                while True:
+                    attempt += 1
+                    response = await self._send('get', path, url, data=data, headers=download.headers(),
+                                                stream=True)
+                    received = time.perf_counter()
+                    try:
+                        if response.status_code == 416 and download.offset:
+                            if download.complete(response.headers):
+                                return download.result()
+                            # The file is longer than the answer, so it isn't a part of it
+                            download.restart()
+                            continue
+                        if response.status_code not in (200, 206):
+                            await response.aread()
+                            return self._decode(response.content)
+                        download.start(response.status_code, response.headers)
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            _time_left()
+                            download.write(chunk)
+                            if stats is not None:
+                                stats.response_bytes += len(chunk)
+                        return download.result()
+                    except httpx.TransportError:
+                        if not self.retry_policy.should_retry('get', attempt):
+                            raise
+                        await asyncio.sleep(_within_deadline(self.retry_policy.delay(attempt)))
+                    finally:
+                        await response.aclose()
+                        if stats is not None:
+                            stats.download += time.perf_counter() - received
+        finally:
+            download.close()
+
+    async def _stream_items(self, method, path, key, data, path_params):
+        url, data = self._build_url(method, path, self._with_fields(method, path, data), path_params)
+        response = await self._send(method, path, url, data=data, stream=True)
+        parser = _JsonArrayStream(key)
+        try:
+            if not 200 <= response.status_code < 300:
+                raise ApiError(response.status_code, _error_answer(self.json_decoder, await response.aread()))
+            async for chunk in response.aiter_bytes(64 * 1024):
+                _time_left()
+                for item in parser.feed(chunk):
+                    yield self._decode_item(key, item)
+        finally:
+            await response.aclose()
+
+    async def _iter_pages(self, fetch, key, page=None, prefetch=0, **kwargs):
+        walk = _PageWalk(self.tracer, fetch, prefetch) if self.tracer is not None else None
+        if walk is not None:
+            fetch = walk.fetch_async
+        try:
+            page = page or 1
+            response = await fetch(page=page, **kwargs)
+            last_page = _last_page(response, key, page) if prefetch else None
+            if last_page:
+                async for item in self._iter_prefetched(fetch, key, response, page, last_page, prefetch, **kwargs):
+                    yield item
+                return
+            seen = 0
+            while True:
+                items = _page_items(response, key)
+                for item in items:
+                    yield item
+                seen += len(items)
+                if not _has_next_page(response, items, key, seen):
+                    return
+                page += 1
+                response = await fetch(page=page, **kwargs)
+        except Exception as error:
+            if walk is not None:
+                walk.end(error)
+                walk = None
+            raise
+        finally:
+            if walk is not None:
+                walk.end()
+
+    async def _iter_prefetched(self, fetch, key, response, page, last_page, prefetch, **kwargs):
+        for item in _page_items(response, key):
+            yield item
+        pending = collections.deque()
+        next_page = page + 1
+        try:
+            while True:
+                while next_page <= last_page and len(pending) < prefetch:
+                    pending.append(asyncio.ensure_future(fetch(page=next_page, **kwargs)))
+                    next_page += 1
+                if not pending:
+                    return
+                items = _page_items(await pending.popleft(), key)
+                if not items:
+                    return
+                for item in items:
+                    yield item
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def close(self):
+        """
+        Close all pooled connections.
+        """
+        await self.session.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,7 @@
+"""
+Benchmarks of LolzApi against a local fake api.lolz.guru (benchmarks.server), run from the repository root:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.compare baseline.json results.json
+The fake server serves answers shaped like the real ones, with configurable latency, 429 injection
+and payload sizes, so the numbers are reproducible and don't spend the real rate budget.
+"""
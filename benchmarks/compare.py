@@ -0,0 +1,70 @@
+"""
+Compare two results of benchmarks.run and fail on regressions:
+    python -m benchmarks.compare baseline.json results.json --threshold 0.1
+Cases are matched by name and compared by duration. The exit status is 1 if any case got slower
+than the threshold allows, so the comparison can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    """
+    :param path: json file written by benchmarks.run
+    :return: environment and results keyed by case name
+    :rtype: tuple
+    """
+    with open(path, encoding='utf-8') as file:
+        report = json.load(file)
+    return report['environment'], {result['name']: result for result in report['results']}
+
+
+def compare(baseline, current, threshold):
+    """
+    :param baseline: results keyed by case name
+    :param current: results keyed by case name
+    :param threshold: allowed slowdown, 0.1 means 10 %
+    :return: (name, baseline seconds, current seconds, change, regressed) of the cases in both results
+    :rtype: list
+    """
+    rows = []
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['metrics']['seconds']
+        after = result['metrics']['seconds']
+        change = after / before - 1 if before else 0.0
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline', help='results of the reference run')
+    parser.add_argument('current', help='results of the run to check')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed slowdown, 0.1 means 10 %%')
+    args = parser.parse_args()
+    baseline_environment, baseline = load(args.baseline)
+    current_environment, current = load(args.current)
+
+    baseline_environment.get('options', {}).pop('only', None)
+    current_environment.get('options', {}).pop('only', None)
+    for key in ('python', 'platform', 'versions', 'options'):
+        if baseline_environment.get(key) != current_environment.get(key):
+            print(f'warning: {key} differs: {baseline_environment.get(key)} != {current_environment.get(key)}')
+    rows = compare(baseline, current, args.threshold)
+    for name, before, after, change, regressed in rows:
+        print(f'{name:36} {before:9.4f} s -> {after:9.4f} s  {change:+7.1%}{"  REGRESSION" if regressed else ""}')
+    for name in sorted(baseline.keys() - current.keys()):
+        print(f'{name:36} missing')
+    for name in sorted(current.keys() - baseline.keys()):
+        print(f'{name:36} new')
+    regressions = sum(regressed for *_, regressed in rows)
+    if regressions:
+        print(f'{regressions} of {len(rows)} cases are more than {args.threshold:.0%} slower')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
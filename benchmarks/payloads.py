@@ -0,0 +1,188 @@
+"""
+Answers shaped like the ones of api.lolz.guru: the same keys, nesting, links and permissions,
+filled with deterministic fake data, so a page of threads or posts has a realistic size and decode cost.
+"""
+import random
+
+BASE = 'https://lolz.guru/'
+API = 'https://api.lolz.guru/'
+WORDS = ('аккаунт', 'продажа', 'гарант', 'steam', 'discord', 'telegram', 'скидка', 'отзыв', 'ключ', 'подписка',
+         'market', 'lolz', 'быстро', 'недорого', 'проверка', 'бот', 'сервис', 'обмен', 'игра', 'скрипт')
+DATE = 1650000000
+
+
+def _text(rng, size):
+    """
+    :param rng: random.Random
+    :param size: approximate length in characters
+    :rtype: str
+    """
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def _permissions(*names):
+    return {name: True for name in names}
+
+
+def user(user_id):
+    """
+    :param user_id:
+    :return: object of GET users/{userID}
+    :rtype: dict
+    """
+    rng = random.Random(user_id)
+    username = f'user{user_id}'
+    return {
+        'user_id': user_id,
+        'username': username,
+        'username_html': f'<span class="style{rng.randint(1, 30)}">{username}</span>',
+        'user_message_count': rng.randint(0, 20000),
+        'user_register_date': DATE - rng.randint(0, 10 ** 8),
+        'user_last_seen_date': DATE + rng.randint(0, 10 ** 6),
+        'user_like_count': rng.randint(0, 50000),
+        'user_title': _text(rng, 20),
+        'user_is_valid': True,
+        'user_is_verified': True,
+        'user_is_followed': rng.random() < 0.1,
+        'user_is_ignored': False,
+        'user_is_visitor': False,
+        'user_group_id': rng.choice((2, 21, 22, 23)),
+        'custom_fields': {'telegram': f'@{username}', 'discord': f'{username}#{rng.randint(1000, 9999)}'},
+        'links': {
+            'permalink': f'{BASE}members/{user_id}/',
+            'detail': f'{API}users/{user_id}',
+            'avatar': f'{BASE}data/avatars/l/{user_id // 1000}/{user_id}.jpg',
+            'avatar_big': f'{BASE}data/avatars/l/{user_id // 1000}/{user_id}.jpg',
+            'avatar_small': f'{BASE}data/avatars/s/{user_id // 1000}/{user_id}.jpg',
+            'followers': f'{API}users/{user_id}/followers',
+            'followings': f'{API}users/{user_id}/followings',
+            'ignore': f'{API}users/{user_id}/ignore',
+            'timeline': f'{API}users/{user_id}/timeline',
+        },
+        'permissions': _permissions('edit', 'follow', 'ignore', 'profile_post'),
+    }
+
+
+def post(post_id, thread_id, body_size=600):
+    """
+    :param post_id:
+    :param thread_id:
+    :param body_size: approximate length of the post text in characters
+    :return: object of GET posts/{postID}
+    :rtype: dict
+    """
+    rng = random.Random(post_id)
+    poster_id = rng.randint(1, 10 ** 6)
+    body = _text(rng, body_size)
+    return {
+        'post_id': post_id,
+        'thread_id': thread_id,
+        'poster_user_id': poster_id,
+        'poster_username': f'user{poster_id}',
+        'post_create_date': DATE + post_id,
+        'post_update_date': DATE + post_id + rng.randint(0, 10 ** 4),
+        'post_body': body,
+        'post_body_html': f'<div class="bbWrapper">{body}</div>',
+        'post_body_plain_text': body,
+        'signature': _text(rng, 40),
+        'signature_html': f'<div class="bbWrapper">{_text(rng, 40)}</div>',
+        'post_like_count': rng.randint(0, 300),
+        'post_attachment_count': 0,
+        'post_is_published': True,
+        'post_is_deleted': False,
+        'post_is_liked': False,
+        'links': {
+            'permalink': f'{BASE}posts/{post_id}/',
+            'detail': f'{API}posts/{post_id}',
+            'thread': f'{API}threads/{thread_id}',
+            'poster': f'{API}users/{poster_id}',
+            'likes': f'{API}posts/{post_id}/likes',
+            'report': f'{API}posts/{post_id}/report',
+            'attachments': f'{API}posts/{post_id}/attachments',
+            'poster_avatar': f'{BASE}data/avatars/m/{poster_id // 1000}/{poster_id}.jpg',
+        },
+        'permissions': _permissions('view', 'edit', 'delete', 'reply', 'like', 'report', 'upload_attachment'),
+    }
+
+
+def thread(thread_id, body_size=600):
+    """
+    :param thread_id:
+    :param body_size: approximate length of the first post text in characters
+    :return: object of GET threads/{threadID}
+    :rtype: dict
+    """
+    rng = random.Random(-thread_id)
+    creator_id = rng.randint(1, 10 ** 6)
+    forum_id = rng.choice((8, 11, 876, 978, 1050))
+    return {
+        'thread_id': thread_id,
+        'forum_id': forum_id,
+        'thread_title': _text(rng, 60),
+        'thread_view_count': rng.randint(0, 10 ** 5),
+        'creator_user_id': creator_id,
+        'creator_username': f'user{creator_id}',
+        'thread_create_date': DATE + thread_id,
+        'thread_update_date': DATE + thread_id + rng.randint(0, 10 ** 5),
+        'thread_post_count': rng.randint(1, 500),
+        'thread_is_published': True,
+        'thread_is_deleted': False,
+        'thread_is_sticky': rng.random() < 0.02,
+        'thread_is_followed': False,
+        'thread_prefixes': [{'prefix_id': rng.randint(1, 100), 'prefix_title': rng.choice(WORDS)}],
+        'thread_tags': {str(rng.randint(1, 10 ** 4)): rng.choice(WORDS) for _ in range(rng.randint(0, 4))},
+        'first_post': post(thread_id * 10, thread_id, body_size),
+        'links': {
+            'permalink': f'{BASE}threads/{thread_id}/',
+            'detail': f'{API}threads/{thread_id}',
+            'followers': f'{API}threads/{thread_id}/followers',
+            'forum': f'{API}forums/{forum_id}',
+            'posts': f'{API}posts?thread_id={thread_id}',
+            'first_poster': f'{API}users/{creator_id}',
+            'first_post': f'{API}posts/{thread_id * 10}',
+            'last_poster': f'{API}users/{creator_id}',
+            'last_post': f'{API}posts/{thread_id * 10}',
+        },
+        'permissions': _permissions('view', 'delete', 'follow', 'post', 'upload_attachment', 'edit'),
+    }
+
+
+def page(key, make, page_number, limit, total, path):
+    """
+    One page of a paginated list.
+    :param key: key of the item list, e.g. 'threads'
+    :param make: function that makes the item with a given number
+    :param page_number: number of the page, from 1
+    :param limit: items per page
+    :param total: items in the whole list
+    :param path: path of the list, for the links
+    :return: answer of the page
+    :rtype: dict
+    """
+    start = (page_number - 1) * limit
+    answer = {key: [make(number) for number in range(start + 1, min(start + limit, total) + 1)],
+              f'{key}_total': total}
+    pages = -(-total // limit)
+    links = {'pages': pages, 'page': page_number}
+    if page_number < pages:
+        links['next'] = f'{API}{path}?page={page_number + 1}&limit={limit}'
+    if page_number > 1:
+        links['prev'] = f'{API}{path}?page={page_number - 1}&limit={limit}'
+    answer['links'] = links
+    return answer
+
+
+def attachment(size, seed=0):
+    """
+    :param size: bytes
+    :param seed:
+    :return: binary content of an attachment
+    :rtype: bytes
+    """
+    return random.Random(seed).randbytes(size)
@@ -0,0 +1,369 @@
+"""
+Run the benchmarks against a fake api in a child process and save the results as json:
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --only throughput pagination --latency 0.05 --repeat 5
+Every case runs --repeat times, the run with the median duration is kept.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+
+from LolzApi import AsyncLolzApi, Cassette, LazyResponse, LolzApi, RetryPolicy, _with_models, msgspec, orjson
+from benchmarks import payloads
+from benchmarks.server import Config, FakeApiProcess
+
+TOKEN = 'benchmark'
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    """
+    Register a group of benchmarks under the name of the function.
+    """
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def _client(cls, base_url, **kwargs):
+    api = cls(TOKEN, **kwargs)
+    api.base_url = base_url
+    return api
+
+
+def _latency_metrics(seconds, latencies):
+    """
+    :param seconds: wall time of all calls
+    :param latencies: seconds of every call
+    :return: seconds, calls, calls_per_second and p50/p90/p99 latencies in milliseconds
+    :rtype: dict
+    """
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {'seconds': seconds, 'calls': len(latencies), 'calls_per_second': len(latencies) / seconds,
+            'p50_ms': quantiles[49] * 1000, 'p90_ms': quantiles[89] * 1000, 'p99_ms': quantiles[98] * 1000}
+
+
+def _peak_memory(function):
+    """
+    :return: peak of memory allocated by Python while function runs, in KiB
+    :rtype: float
+    """
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def _measure(name, params, case, repeat):
+    """
+    :param name: name of the case, e.g. 'throughput/async'
+    :param params: parameters of the case, saved with the results
+    :param case: function that runs the case once and returns its metrics with 'seconds'
+    :param repeat: how many times to run the case
+    :return: result with the metrics of the median run
+    :rtype: dict
+    """
+    runs = sorted((case() for _ in range(repeat)), key=lambda metrics: metrics['seconds'])
+    metrics = runs[len(runs) // 2]
+    summary = '  '.join(f'{key}={value:.4g}' for key, value in metrics.items() if key != 'seconds')
+    print(f'{name:36} {metrics["seconds"]:9.4f} s  {summary}', file=sys.stderr)
+    return {'name': name, 'params': params, 'metrics': metrics}
+
+
+def _sync_calls(api, ids):
+    latencies = []
+    started = time.perf_counter()
+    for thread_id in ids:
+        call_started = time.perf_counter()
+        api.get_thread_detail(thread_id)
+        latencies.append(time.perf_counter() - call_started)
+    return _latency_metrics(time.perf_counter() - started, latencies)
+
+
+def _threaded_calls(api, ids, workers):
+    def call(thread_id):
+        call_started = time.perf_counter()
+        api.get_thread_detail(thread_id)
+        return time.perf_counter() - call_started
+
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        started = time.perf_counter()
+        latencies = list(pool.map(call, ids))
+        return _latency_metrics(time.perf_counter() - started, latencies)
+
+
+def _async_calls(base_url, ids, concurrency, **kwargs):
+    async def run():
+        api = _client(AsyncLolzApi, base_url, max_connections=concurrency, **kwargs)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(thread_id):
+            async with semaphore:
+                call_started = time.perf_counter()
+                await api.get_thread_detail(thread_id)
+                return time.perf_counter() - call_started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*map(call, ids))
+        seconds = time.perf_counter() - started
+        await api.close()
+        return _latency_metrics(seconds, latencies)
+
+    return asyncio.run(run())
+
+
+@benchmark
+def throughput(args):
+    """
+    Single calls one after another, from a thread pool and from asyncio tasks.
+    """
+    config = Config(latency=args.latency, jitter=args.latency / 4)
+    ids = range(1, args.calls + 1)
+    sequential = range(1, max(args.calls // 4, 10) + 1)
+    params = {'latency': config.latency, 'jitter': config.jitter, 'calls': args.calls}
+    with FakeApiProcess(config) as base_url:
+        return [
+            _measure('throughput/sync', dict(params, calls=len(sequential)),
+                     lambda: _sync_calls(_client(LolzApi, base_url, coalesce=False), sequential), args.repeat),
+            _measure('throughput/threaded', dict(params, workers=args.workers),
+                     lambda: _threaded_calls(_client(LolzApi, base_url, coalesce=False, max_connections=args.workers),
+                                             ids, args.workers), args.repeat),
+            _measure('throughput/async', dict(params, concurrency=args.concurrency),
+                     lambda: _async_calls(base_url, ids, args.concurrency, coalesce=False), args.repeat),
+        ]
+
+
+@benchmark
+def throttled(args):
+    """
+    The same calls with a share of them answered with 429, so the retries are part of the cost.
+    """
+    config = Config(latency=args.latency, jitter=args.latency / 4, rate_429=args.rate_429)
+    ids = range(1, args.calls + 1)
+    params = {'latency': config.latency, 'rate_429': config.rate_429, 'calls': args.calls}
+    retry_policy = RetryPolicy(attempts=10, backoff=0.01, max_backoff=0.1)
+    with FakeApiProcess(config) as base_url:
+        return [
+            _measure('throttled/threaded', dict(params, workers=args.workers),
+                     lambda: _threaded_calls(_client(LolzApi, base_url, coalesce=False, retry_policy=retry_policy,
+                                                     max_connections=args.workers), ids, args.workers), args.repeat),
+            _measure('throttled/async', dict(params, concurrency=args.concurrency),
+                     lambda: _async_calls(base_url, ids, args.concurrency, coalesce=False,
+                                          retry_policy=retry_policy), args.repeat),
+        ]
+
+
+def _walk(base_url, prefetch, limit):
+    api = _client(LolzApi, base_url)
+    started = time.perf_counter()
+    items = sum(1 for _ in api.iter_threads(forum_id=1, limit=limit, prefetch=prefetch))
+    seconds = time.perf_counter() - started
+    return {'seconds': seconds, 'items': items, 'items_per_second': items / seconds}
+
+
+def _walk_async(base_url, prefetch, limit):
+    async def run():
+        api = _client(AsyncLolzApi, base_url)
+        started = time.perf_counter()
+        items = 0
+        async for _ in api.iter_threads(forum_id=1, limit=limit, prefetch=prefetch):
+            items += 1
+        seconds = time.perf_counter() - started
+        await api.close()
+        return {'seconds': seconds, 'items': items, 'items_per_second': items / seconds}
+
+    return asyncio.run(run())
+
+
+@benchmark
+def pagination(args):
+    """
+    Walks over all pages of a list with iter_threads, with and without prefetching the next pages.
+    """
+    config = Config(latency=args.latency, jitter=args.latency / 4, total=args.items)
+    params = {'latency': config.latency, 'items': args.items, 'limit': args.limit}
+    results = []
+    with FakeApiProcess(config) as base_url:
+        for prefetch in (0, 2, 4):
+            results.append(_measure(f'pagination/sync/prefetch={prefetch}', dict(params, prefetch=prefetch),
+                                    lambda: _walk(base_url, prefetch, args.limit), args.repeat))
+        for prefetch in (0, 2, 4):
+            results.append(_measure(f'pagination/async/prefetch={prefetch}', dict(params, prefetch=prefetch),
+                                    lambda: _walk_async(base_url, prefetch, args.limit), args.repeat))
+    return results
+
+
+@benchmark
+def replay(args):
+    """
+    The pagination walk from the network and replayed from a cassette recorded on the first walk.
+    """
+    config = Config(latency=args.latency, jitter=args.latency / 4, total=args.items)
+    params = {'latency': config.latency, 'items': args.items, 'limit': args.limit}
+    with FakeApiProcess(config) as base_url, tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'walk.cassette')
+
+        def walk(mode):
+            api = _client(LolzApi, base_url, cassette=Cassette(path, mode))
+            started = time.perf_counter()
+            items = sum(1 for _ in api.iter_threads(forum_id=1, limit=args.limit))
+            seconds = time.perf_counter() - started
+            api.cassette.close()
+            return {'seconds': seconds, 'items': items, 'items_per_second': items / seconds}
+
+        return [_measure('replay/record', params, lambda: walk('record'), args.repeat),
+                _measure('replay/replay', params, lambda: walk('replay'), args.repeat)]
+
+
+def _download(base_url, sink):
+    api = _client(LolzApi, base_url)
+    started = time.perf_counter()
+    answer = api.download_attachment_post(1, 1, sink)
+    return time.perf_counter() - started, len(answer) if sink is None else answer['size']
+
+
+def _download_async(base_url, sink):
+    async def run():
+        api = _client(AsyncLolzApi, base_url)
+        started = time.perf_counter()
+        answer = await api.download_attachment_post(1, 1, sink)
+        seconds = time.perf_counter() - started
+        await api.close()
+        return seconds, len(answer) if sink is None else answer['size']
+
+    return asyncio.run(run())
+
+
+@benchmark
+def attachments(args):
+    """
+    Attachment downloads read into memory and streamed into a file, with the peak of Python memory.
+    """
+    size = int(args.attachment_mb * 1024 * 1024)
+    config = Config(latency=0, attachment_size=size)
+    params = {'size': size}
+    results = []
+    with FakeApiProcess(config) as base_url, tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'attachment')
+
+        def case(download, sink):
+            def run():
+                if sink is not None and os.path.exists(sink):
+                    os.remove(sink)
+                return download(base_url, sink)
+
+            seconds, received = run()
+            peak = _peak_memory(run)
+            return {'seconds': seconds, 'mb_per_second': received / seconds / 1024 / 1024, 'peak_kib': peak}
+
+        for name, download, sink in (('memory', _download, None), ('file', _download, path),
+                                     ('async/memory', _download_async, None), ('async/file', _download_async, path)):
+            results.append(_measure(f'attachments/{name}', params, lambda: case(download, sink), args.repeat))
+    return results
+
+
+@benchmark
+def decode(args):
+    """
+    Decoding of one large page of threads with every available decoder, models and lazy answers.
+    """
+    content = json.dumps(payloads.page('threads', payloads.thread, 1, args.limit * 5, args.limit * 5,
+                                       'threads')).encode()
+    decoders = {'json': json.loads}
+    if orjson is not None:
+        decoders['orjson'] = orjson.loads
+    if msgspec is not None:
+        decoders['msgspec'] = msgspec.json.Decoder().decode
+    decoders['models'] = lambda body: _with_models(json.loads(body))
+    decoders['lazy/untouched'] = lambda body: LazyResponse(body, json.loads)
+    decoders['lazy/accessed'] = lambda body: LazyResponse(body, json.loads)['links']
+    params = {'bytes': len(content), 'iterations': args.iterations}
+
+    def case(decoder):
+        started = time.perf_counter()
+        for _ in range(args.iterations):
+            decoder(content)
+        seconds = time.perf_counter() - started
+        return {'seconds': seconds, 'ms_per_decode': seconds / args.iterations * 1000,
+                'mb_per_second': len(content) * args.iterations / seconds / 1024 / 1024}
+
+    return [_measure(f'decode/{name}', params, lambda: case(decoder), args.repeat)
+            for name, decoder in decoders.items()]
+
+
+def _version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment(args):
+    """
+    :return: what the results depend on besides the code: interpreter, platform, library versions and options
+    :rtype: dict
+    """
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'versions': {name: _version(name) for name in ('requests', 'urllib3', 'httpx', 'h2', 'orjson', 'msgspec')},
+        'options': {key: value for key, value in vars(args).items() if key != 'output'},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', help='json file for the results, stdout by default')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every case, the median is kept')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds before every answer')
+    parser.add_argument('--calls', type=int, default=200, help='calls of the throughput benchmarks')
+    parser.add_argument('--workers', type=int, default=16, help='threads of the threaded cases')
+    parser.add_argument('--concurrency', type=int, default=32, help='calls in flight of the async cases')
+    parser.add_argument('--rate-429', type=float, default=0.1, help='share of 429 answers in the throttled cases')
+    parser.add_argument('--items', type=int, default=400, help='items of the paginated list')
+    parser.add_argument('--limit', type=int, default=20, help='items per page')
+    parser.add_argument('--attachment-mb', type=float, default=20, help='size of the downloaded attachment')
+    parser.add_argument('--iterations', type=int, default=50, help='decodes per decode case')
+    parser.add_argument('--quick', action='store_true', help='small sizes and one run, to check that it works')
+    args = parser.parse_args()
+    if args.quick:
+        args.repeat, args.calls, args.items, args.attachment_mb, args.iterations = 1, 40, 100, 2, 5
+
+    results = []
+    for name in args.only or BENCHMARKS:
+        results.extend(BENCHMARKS[name](args))
+    report = json.dumps({'environment': environment(args), 'results': results}, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Fake api.lolz.guru for benchmarks:
+    python -m benchmarks.server --port 8765 --latency 0.02 --rate-429 0.05
+Serves threads, posts, users, search and post attachments with answers from benchmarks.payloads,
+after a configurable latency, and answers a share of the requests with 429 Too Many Requests.
+Run it in its own process (FakeApiProcess does that), so it doesn't compete with the client for the GIL.
+"""
+import argparse
+import functools
+import json
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks import payloads
+
+
+class Config:
+    def __init__(self, latency=0.02, jitter=0.0, rate_429=0.0, total=200, body_size=600,
+                 attachment_size=5 * 1024 * 1024, seed=0):
+        """
+        :param latency: seconds before every answer
+        :param jitter: random extra latency, up to this many seconds
+        :param rate_429: share of requests answered with 429 and Retry-After: 0
+        :param total: items in every paginated list
+        :param body_size: approximate length of post texts in characters
+        :param attachment_size: bytes of every attachment
+        :param seed: seed of the latency jitter and of the 429 choice
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.total = total
+        self.body_size = body_size
+        self.attachment_size = attachment_size
+        self.seed = seed
+
+    def arguments(self):
+        """
+        :return: command line arguments of benchmarks.server for this config
+        :rtype: list
+        """
+        return [f'--latency={self.latency}', f'--jitter={self.jitter}', f'--rate-429={self.rate_429}',
+                f'--total={self.total}', f'--body-size={self.body_size}',
+                f'--attachment-size={self.attachment_size}', f'--seed={self.seed}']
+
+
+class FakeApi:
+    """
+    Builds the answers. Encoded answers are cached, so the server spends its time on the network, not on json.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.attachment = payloads.attachment(config.attachment_size, config.seed)
+        self.routes = [
+            ('GET', re.compile(r'threads'), self.threads),
+            ('GET', re.compile(r'threads/(\d+)'), self.thread),
+            ('GET', re.compile(r'posts'), self.posts),
+            ('GET', re.compile(r'posts/(\d+)'), self.post),
+            ('GET', re.compile(r'users/(\d+)'), self.user),
+            ('POST', re.compile(r'search'), self.search),
+        ]
+
+    def wait(self):
+        """
+        Sleep for the latency of one answer.
+        :return: True if the request should be answered with 429
+        :rtype: bool
+        """
+        with self.lock:
+            delay = self.config.latency + self.random.uniform(0, self.config.jitter)
+            limited = self.random.random() < self.config.rate_429
+        time.sleep(delay)
+        return limited
+
+    def answer(self, method, path, params):
+        """
+        :param method: http method
+        :param path: path without the leading slash
+        :param params: query or form parameters as sorted (name, value) pairs
+        :return: http status and json body
+        :rtype: tuple
+        """
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                return 200, handler(params, *map(int, match.groups()))
+        return 404, json.dumps({'errors': ['Requested page could not be found.']}).encode()
+
+    @functools.lru_cache(maxsize=4096)
+    def _page(self, key, params, path, thread_id=None):
+        params = dict(params)
+        if thread_id is None:
+            make = functools.partial(payloads.thread, body_size=self.config.body_size)
+        else:
+            make = functools.partial(payloads.post, thread_id=thread_id, body_size=self.config.body_size)
+        answer = payloads.page(key, make, int(params.get('page', 1)), int(params.get('limit', 20)),
+                               self.config.total, path)
+        return json.dumps(answer).encode()
+
+    def threads(self, params):
+        return self._page('threads', params, 'threads')
+
+    def search(self, params):
+        return self._page('data', params, 'search')
+
+    def posts(self, params):
+        return self._page('posts', params, 'posts', int(dict(params).get('thread_id', 1)))
+
+    @functools.lru_cache(maxsize=4096)
+    def thread(self, params, thread_id):
+        return json.dumps({'thread': payloads.thread(thread_id, self.config.body_size)}).encode()
+
+    @functools.lru_cache(maxsize=4096)
+    def post(self, params, post_id):
+        return json.dumps({'post': payloads.post(post_id, 1, self.config.body_size)}).encode()
+
+    @functools.lru_cache(maxsize=4096)
+    def user(self, params, user_id):
+        return json.dumps({'user': payloads.user(user_id)}).encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    api = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json; charset=utf-8', headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        url = urlsplit(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query or body).items()}
+        if self.api.wait():
+            return self._send(429, b'{"errors":["Too many requests"]}', headers=[('Retry-After', '0')])
+        path = url.path.strip('/')
+        if self.command == 'GET' and re.fullmatch(r'posts/\d+/attachments/\d+', path):
+            return self._attachment()
+        status, answer = self.api.answer(self.command, path, tuple(sorted(params.items())))
+        self._send(status, answer)
+
+    def _attachment(self):
+        content = self.api.attachment
+        match = re.fullmatch(r'bytes=(\d+)-', self.headers.get('Range') or '')
+        if match and int(match.group(1)) >= len(content):
+            return self._send(416, b'', headers=[('Content-Range', f'bytes */{len(content)}')])
+        if match:
+            start = int(match.group(1))
+            return self._send(206, content[start:], 'image/png',
+                              [('Content-Range', f'bytes {start}-{len(content) - 1}/{len(content)}')])
+        self._send(200, content, 'image/png')
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(config, host='127.0.0.1', port=0):
+    """
+    :param config: Config
+    :param host:
+    :param port: 0 picks a free port
+    :return: the server, not started yet, call serve_forever() on it
+    :rtype: Server
+    """
+    handler = type('Handler', (Handler,), {'api': FakeApi(config)})
+    return Server((host, port), handler)
+
+
+class FakeApiProcess:
+    """
+    Fake api in a child process:
+        with FakeApiProcess(Config(latency=0.05)) as base_url:
+            api = LolzApi(token)
+            api.base_url = base_url
+    """
+
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self.process = None
+
+    def __enter__(self):
+        command = [sys.executable, '-m', 'benchmarks.server', '--port=0'] + self.config.arguments()
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        return self.process.stdout.readline().strip()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.process.terminate()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds before every answer')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra latency, up to this many seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='share of requests answered with 429')
+    parser.add_argument('--total', type=int, default=200, help='items in every paginated list')
+    parser.add_argument('--body-size', type=int, default=600, help='approximate length of post texts')
+    parser.add_argument('--attachment-size', type=int, default=5 * 1024 * 1024, help='bytes of every attachment')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    config = Config(args.latency, args.jitter, args.rate_429, args.total, args.body_size, args.attachment_size,
+                    args.seed)
+    server = serve(config, args.host, args.port)
+    print(f'http://{args.host}:{server.server_address[1]}/', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from LolzApi import Cassette, CassetteMiss, LolzApi
+
+
+class Handler(BaseHTTPRequestHandler):
+    def answer(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.received.append((self.command, self.path.split('?')[0]))
+        body = json.dumps({'status': 'ok'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_DELETE = do_PUT = answer
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.received = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(server, cassette):
+    api = LolzApi('token', cassette=cassette)
+    api.base_url = f'http://127.0.0.1:{server.server_port}/'
+    return api
+
+
+def test_repeated_writes_reach_the_server(server, tmp_path):
+    api = client(server, Cassette(str(tmp_path / 'writes.cassette')))
+    for _ in range(3):
+        api.like_post(5)
+        api.unlike_post(5)
+        api.read_notification()
+    assert server.received == [('POST', '/posts/5/likes'), ('DELETE', '/posts/5/likes'),
+                               ('POST', '/notifications/read')] * 3
+    assert api.cassette.recorded == 0
+    assert api.cassette.replayed == 0
+
+
+def test_reads_are_replayed(server, tmp_path):
+    api = client(server, Cassette(str(tmp_path / 'reads.cassette')))
+    for _ in range(3):
+        api.get_thread_detail(1)
+        api.search_content('query')
+    assert server.received == [('GET', '/threads/1'), ('POST', '/search')]
+    assert api.cassette.replayed == 4
+
+
+def test_writes_are_not_replayed_offline(server, tmp_path):
+    filename = str(tmp_path / 'offline.cassette')
+    client(server, Cassette(filename)).get_thread_detail(1)
+    api = client(server, Cassette(filename, mode='replay'))
+    api.get_thread_detail(1)
+    with pytest.raises(CassetteMiss):
+        api.like_post(5)
+    assert server.received == [('GET', '/threads/1')]
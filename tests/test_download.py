@@ -0,0 +1,172 @@
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from LolzApi import DownloadRestartError, LolzApi, RetryPolicy
+
+CONTENT = bytes(range(256)) * 1000
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serves server.content with Range and If-Range. While server.drops is set, the connection is cut
+    after `drop_after` bytes of the body and server.content is replaced with server.changed, if given.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        byte_range, if_range = self.headers.get('Range'), self.headers.get('If-Range')
+        server.received.append((byte_range, if_range))
+        content = server.content
+        start = int(byte_range[len('bytes='):-1]) if byte_range else 0
+        if if_range is not None and if_range != server.etag:
+            start = 0
+        if start >= len(content) and start:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{len(content)}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = content[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(content) - 1}/{len(content)}')
+        if server.etag:
+            self.send_header('ETag', server.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if server.drops:
+            server.drops -= 1
+            self.wfile.write(body[:server.drop_after])
+            self.wfile.flush()
+            if server.changed is not None:
+                server.content, server.etag = server.changed, server.etag and '"changed"'
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Pipe(io.RawIOBase):
+    """
+    Sink that can't seek, like a pipe or a socket.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, chunk):
+        self.data += chunk
+        return len(chunk)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.content, server.etag, server.changed = CONTENT, '"a"', None
+    server.drops, server.drop_after = 0, 100000
+    server.received = []
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api(server):
+    api = LolzApi('token', retry_policy=RetryPolicy(backoff=0.01))
+    api.base_url = f'http://127.0.0.1:{server.server_port}/'
+    return api
+
+
+def test_existing_file_is_overwritten(api, server, tmp_path):
+    sink = tmp_path / 'file'
+    sink.write_bytes(b'unrelated')
+    result = api.download_attachment_post(1, 2, str(sink))
+    assert sink.read_bytes() == CONTENT
+    assert result['resumed'] is False
+    assert server.received == [(None, None)]
+
+
+def test_drop_is_resumed_with_if_range(api, server, tmp_path):
+    server.drops = 1
+    sink = tmp_path / 'file'
+    result = api.download_attachment_post(1, 2, str(sink))
+    assert sink.read_bytes() == CONTENT
+    assert result['resumed'] is True
+    offset = int(server.received[1][0][len('bytes='):-1])
+    assert 0 < offset <= server.drop_after
+    assert server.received[1][1] == '"a"'
+
+
+def test_opt_in_resume_of_an_existing_file(api, server, tmp_path):
+    sink = tmp_path / 'file'
+    sink.write_bytes(CONTENT[:1000])
+    result = api.download_attachment_post(1, 2, str(sink), resume=True)
+    assert sink.read_bytes() == CONTENT
+    assert result['resumed'] is True
+    assert server.received == [('bytes=1000-', None)]
+
+
+def test_416_for_a_complete_file(api, server, tmp_path):
+    sink = tmp_path / 'file'
+    sink.write_bytes(CONTENT)
+    result = api.download_attachment_post(1, 2, str(sink), resume=True)
+    assert result['size'] == len(CONTENT)
+    assert sink.read_bytes() == CONTENT
+
+
+def test_416_for_a_longer_file_restarts(api, server, tmp_path):
+    sink = tmp_path / 'file'
+    sink.write_bytes(CONTENT + b'more')
+    result = api.download_attachment_post(1, 2, str(sink), resume=True)
+    assert sink.read_bytes() == CONTENT
+    assert result['resumed'] is False
+    assert server.received == [(f'bytes={len(CONTENT) + 4}-', None), (None, None)]
+
+
+def test_if_range_mismatch_downloads_the_new_body(api, server, tmp_path):
+    server.drops, server.changed = 1, CONTENT[::-1]
+    sink = tmp_path / 'file'
+    result = api.download_attachment_post(1, 2, str(sink))
+    assert sink.read_bytes() == CONTENT[::-1]
+    assert result['resumed'] is False
+
+
+def test_if_range_mismatch_rewinds_a_file_object(api, server):
+    server.drops, server.changed = 1, CONTENT[::-1]
+    sink = io.BytesIO(b'prefix')
+    sink.seek(0, os.SEEK_END)
+    api.download_attachment_post(1, 2, sink)
+    assert sink.getvalue() == b'prefix' + CONTENT[::-1]
+
+
+def test_if_range_mismatch_fails_for_a_sink_that_can_not_seek(api, server):
+    server.drops, server.changed = 1, CONTENT[::-1]
+    with pytest.raises(DownloadRestartError):
+        api.download_attachment_post(1, 2, Pipe())
+
+
+def test_drop_is_resumed_into_a_sink_that_can_not_seek(api, server):
+    server.drops = 1
+    sink = Pipe()
+    api.download_attachment_post(1, 2, sink)
+    assert bytes(sink.data) == CONTENT
+
+
+def test_416_after_a_drop_fails_for_a_sink_that_can_not_seek(api, server):
+    # Without a validator the server can't tell the body changed, it only finds the range is past its end
+    server.etag, server.drops, server.changed = None, 1, CONTENT[:10]
+    sink = Pipe()
+    with pytest.raises(DownloadRestartError):
+        api.download_attachment_post(1, 2, sink)
+    assert len(sink.data) <= server.drop_after
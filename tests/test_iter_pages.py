@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from LolzApi import ApiError, AsyncLolzApi, LolzApi
+
+ERROR = {'errors': ['Service Unavailable']}
+
+
+def pages(count, per_page=10, failing=None):
+    """
+    Answers of a paginated endpoint with `count` pages, the page `failing` is answered with an error.
+    """
+    total = count * per_page
+
+    def answer(page):
+        if page == failing:
+            return ERROR
+        first = (page - 1) * per_page
+        return {'threads': [{'thread_id': first + number} for number in range(per_page)],
+                'threads_total': total, 'links': {'pages': count, **({'next': ''} if page < count else {})}}
+
+    return answer
+
+
+def client(answer):
+    api = LolzApi('token')
+    api.get_threads = lambda page=1, **kwargs: answer(page)
+    return api
+
+
+def async_client(answer):
+    api = AsyncLolzApi('token')
+
+    async def get_threads(page=1, **kwargs):
+        await asyncio.sleep(0)
+        return answer(page)
+
+    api.get_threads = get_threads
+    return api
+
+
+async def collect(api, **kwargs):
+    try:
+        return [item async for item in api.iter_threads(**kwargs)]
+    finally:
+        await api.close()
+
+
+def test_walks_every_page():
+    assert len(list(client(pages(3)).iter_threads())) == 30
+
+
+def test_error_page_in_the_middle_raises():
+    walked = []
+    with pytest.raises(ApiError) as raised:
+        for item in client(pages(3, failing=2)).iter_threads():
+            walked.append(item)
+    assert len(walked) == 10
+    assert raised.value.answer == ERROR
+
+
+def test_error_on_the_first_page_raises():
+    with pytest.raises(ApiError):
+        list(client(pages(3, failing=1)).iter_threads())
+
+
+def test_async_walks_every_page():
+    assert len(asyncio.run(collect(async_client(pages(3))))) == 30
+
+
+def test_async_error_page_in_the_middle_raises():
+    with pytest.raises(ApiError):
+        asyncio.run(collect(async_client(pages(3, failing=2))))
+
+
+def test_prefetched_walks_every_page():
+    assert len(list(client(pages(3)).iter_threads(prefetch=2))) == 30
+
+
+def test_prefetched_error_page_raises():
+    walked = []
+    with pytest.raises(ApiError):
+        for item in client(pages(3, failing=2)).iter_threads(prefetch=2):
+            walked.append(item)
+    assert len(walked) == 10
+
+
+def test_async_prefetched_error_page_raises():
+    with pytest.raises(ApiError):
+        asyncio.run(collect(async_client(pages(3, failing=2)), prefetch=2))
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from LolzApi import _JsonArrayStream
+
+
+def parse(body, key='threads', splits=()):
+    """
+    Feed body cut at the given offsets and decode the elements that come out.
+    """
+    parser = _JsonArrayStream(key)
+    items = []
+    start = 0
+    for end in list(splits) + [len(body)]:
+        items.extend(parser.feed(body[start:end]))
+        start = end
+    return [json.loads(item) for item in items]
+
+
+def every_split(body, key='threads'):
+    """
+    Elements of body for every way of cutting it in two and for feeding it byte by byte.
+    """
+    results = [parse(body, key, [split]) for split in range(len(body) + 1)]
+    results.append(parse(body, key, range(1, len(body))))
+    return results
+
+
+BODIES = [
+    {'threads': [{'thread_id': 1, 'thread_title': 'a'}, {'thread_id': 2, 'thread_title': 'b'}], 'threads_total': 2},
+    {'links': {'threads': [9]}, 'threads': [{'thread_id': 1}], 'threads_total': 1},
+    {'threads': [{'thread_title': 'quote \" and backslash \\\\ and \\\\\" both'}]},
+    {'threads': [{'thread_title': 'brackets ] } [ { and , comma : colon'}]},
+    {'threads': [{'thread_title': 'юникод   ok', 'tags': {'1': 'x'}}]},
+    {'threads': [{'nested': [[1, 2], [3, [4, 5]]], 'empty': [], 'object': {}}]},
+    {'threads_total': 0, 'threads': []},
+    {'threads': [1, 'a,b', True, None, 2.5, -3e2, '']},
+    {'threads': [[], {}, [[]]]},
+    {'"threads"': [1], 'threads': [2]},
+]
+
+
+@pytest.mark.parametrize('data', BODIES)
+@pytest.mark.parametrize('separators', [(',', ':'), (', ', ': ')])
+def test_elements_for_every_chunk_split(data, separators):
+    body = json.dumps(data, separators=separators, ensure_ascii=False).encode()
+    for items in every_split(body):
+        assert items == data['threads']
+
+
+def test_pretty_printed_body():
+    data = BODIES[0]
+    body = json.dumps(data, indent=4).encode()
+    for items in every_split(body):
+        assert items == data['threads']
+
+
+@pytest.mark.parametrize('body', [
+    b'{"threads": null}',
+    b'{"threads": "[1, 2]"}',
+    b'{"threads": 5, "posts": [1]}',
+    b'{"threads": {"threads": [1]}}',
+    b'{"data": {"threads": [1]}}',
+    b'{"errors": ["Requested page could not be found."]}',
+])
+def test_no_elements_when_key_is_not_an_array(body):
+    for items in every_split(body):
+        assert items == []
+
+
+def test_arrays_inside_a_non_array_value_are_ignored():
+    body = b'{"threads": {"a": [1, 2]}, "links": {"next": "x"}}'
+    for items in every_split(body):
+        assert items == []
+
+
+def test_elements_come_out_as_soon_as_they_are_complete():
+    parser = _JsonArrayStream('posts')
+    assert [json.loads(item) for item in parser.feed(b'{"posts": [{"post_id": 1}, {"post_')] == [{'post_id': 1}]
+    assert [json.loads(item) for item in parser.feed(b'id": 2}')] == [{'post_id': 2}]
+    assert parser.feed(b'], "posts_total": 2}') == []
+
+
+def test_buffer_only_holds_the_unfinished_element():
+    parser = _JsonArrayStream('threads')
+    parser.feed(b'{"threads": [' + b'{"a": "' + b'x' * 1000 + b'"}, ')
+    assert len(parser.buffer) < 10
+    parser.feed(b'{"a": "' + b'y' * 50)
+    assert len(parser.buffer) <= 60
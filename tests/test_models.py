@@ -0,0 +1,51 @@
+import copy
+import pickle
+
+import pytest
+
+import LolzApi
+from LolzApi import Post, Thread
+
+THREAD = {'thread_id': 1, 'thread_title': 'title', 'links': {'permalink': 'https://lolz.live/threads/1/'},
+          'thread_tags': {'1': 'tag'}, 'first_post': {'post_id': 10, 'post_body': 'body'}}
+
+
+def test_fields_outside_slots_are_decoded_once(monkeypatch):
+    decoded = []
+
+    def decode(content):
+        decoded.append(content)
+        return LolzApi.json.loads(content)
+
+    monkeypatch.setattr(LolzApi, '_decode_json', decode)
+    thread = Thread(THREAD)
+    assert thread.links == THREAD['links']
+    assert thread.thread_tags == THREAD['thread_tags']
+    assert thread.first_post == THREAD['first_post']
+    assert thread.to_dict() == THREAD
+    assert len(decoded) == 1
+
+
+def test_unset_and_unknown_fields():
+    thread = Thread({'thread_id': 1})
+    assert thread.thread_title is None
+    assert thread.extra == {}
+    assert thread.to_dict() == {'thread_id': 1}
+    with pytest.raises(AttributeError):
+        thread.permissions
+
+
+def test_copy_and_pickle_keep_every_field():
+    thread = Thread(THREAD)
+    accessed = Thread(THREAD)
+    accessed.links
+    for model in (thread, accessed):
+        assert pickle.loads(pickle.dumps(model)).to_dict() == THREAD
+        assert copy.deepcopy(model).to_dict() == THREAD
+        assert copy.copy(model).to_dict() == THREAD
+
+
+def test_each_model_has_its_own_fields():
+    post = Post({'post_id': 10, 'thread_id': 1, 'thread_title': 'not a post field'})
+    assert post.thread_id == 1
+    assert post.extra == {'thread_title': 'not a post field'}
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+
+from LolzApi import AsyncLolzApi, LolzApi
+
+
+def test_followers_share_the_answer():
+    api = LolzApi('token')
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return b'answer'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(api._single_flight('key', fetch)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(api._single_flight('key', fetch)))
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert results == [b'answer', b'answer']
+    assert len(calls) == 1
+    assert api.in_flight == {}
+
+
+def test_leader_failure_reaches_followers():
+    api = LolzApi('token')
+    started = threading.Event()
+    release = threading.Event()
+
+    def fetch():
+        started.set()
+        release.wait(5)
+        raise ValueError('failed')
+
+    errors = []
+
+    def call():
+        try:
+            api._single_flight('key', fetch)
+        except ValueError as error:
+            errors.append(error)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    assert len(errors) == 2
+    assert api.in_flight == {}
+    assert api._single_flight('key', lambda: b'again') == b'again'
+
+
+def test_async_followers_share_the_answer():
+    async def run():
+        api = AsyncLolzApi('token')
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return b'answer'
+
+        results = await asyncio.gather(*(api._single_flight('key', fetch) for _ in range(3)))
+        await api.close()
+        return results, calls, api.in_flight
+
+    results, calls, in_flight = asyncio.run(run())
+    assert results == [b'answer'] * 3
+    assert len(calls) == 1
+    assert in_flight == {}
+
+
+def test_async_leader_failure_reaches_followers():
+    async def run():
+        api = AsyncLolzApi('token')
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError('failed')
+
+        results = await asyncio.gather(api._single_flight('key', fetch), api._single_flight('key', fetch),
+                                       return_exceptions=True)
+        await api.close()
+        return results, api.in_flight
+
+    results, in_flight = asyncio.run(run())
+    assert [type(result) for result in results] == [ValueError, ValueError]
+    assert in_flight == {}
+
+
+def test_async_leader_cancellation_does_not_cancel_followers():
+    async def run():
+        api = AsyncLolzApi('token')
+
+        async def fetch():
+            await asyncio.sleep(0.05)
+            return b'answer'
+
+        leader = asyncio.ensure_future(api._single_flight('key', fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(api._single_flight('key', fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        answer = await follower
+        await api.close()
+        return answer, api.in_flight
+
+    answer, in_flight = asyncio.run(run())
+    assert answer == b'answer'
+    assert in_flight == {}
+
+
+def test_async_cancelled_leader_alone_leaves_nothing_behind():
+    async def run():
+        api = AsyncLolzApi('token')
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError('failed')
+
+        leader = asyncio.ensure_future(api._single_flight('key', fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        await asyncio.sleep(0.05)
+        await api.close()
+        return api.in_flight
+
+    assert asyncio.run(run()) == {}